@@ -153,14 +153,13 @@ func getActualGPUCount() (int, error) {
 		return 0, fmt.Errorf("nvidia-smi not available: %s", result.Error)
 	}
 
-	// Count the number of lines in the output (each line is a GPU)
+	// Count the number of lines in the output (each line is a GPU) without splitting it
 	output := strings.TrimSpace(result.Output)
 	if output == "" {
 		return 0, nil
 	}
 
-	lines := strings.Split(output, "\n")
-	return len(lines), nil
+	return strings.Count(output, "\n") + 1, nil
 }
 
 func RunGPUCountCheck() error {
@@ -142,8 +142,7 @@ NVIDIA GeForce RTX 3090`,
 			if output == "" {
 				count = 0
 			} else {
-				lines := strings.Split(output, "\n")
-				count = len(lines)
+				count = strings.Count(output, "\n") + 1
 			}
 
 			if count != tt.expectedCount {
@@ -7,6 +7,8 @@ import (
 	"os"
 	"path/filepath"
 	"runtime"
+	"sync"
+	"time"
 )
 
 // SRAMThreshold represents the threshold configuration for SRAM checks
@@ -31,6 +33,19 @@ type TestLimits struct {
 	TestLimits map[string]ShapeTestConfig `json:"test_limits"`
 }
 
+// testLimitsCacheEntry holds a parsed test limits file together with the file state it was parsed from
+type testLimitsCacheEntry struct {
+	modTime time.Time
+	size    int64
+	limits  *TestLimits
+}
+
+// Parsed test limits files keyed by path, reused while the file is unchanged
+var (
+	testLimitsCacheMu sync.Mutex
+	testLimitsCache   = make(map[string]testLimitsCacheEntry)
+)
+
 // getPackageDir returns the directory where this package resides
 func getPackageDir() (string, error) {
 	_, filename, _, ok := runtime.Caller(0)
@@ -83,8 +98,19 @@ func LoadTestLimits() (*TestLimits, error) {
 	return LoadTestLimitsFromFile(configPath)
 }
 
-// LoadTestLimitsFromFile reads and parses the test limits JSON configuration file from a specific path
+// LoadTestLimitsFromFile reads and parses the test limits JSON configuration file from a specific path.
+// The parsed result is cached and reused until the file's modification time or size changes.
 func LoadTestLimitsFromFile(filePath string) (*TestLimits, error) {
+	info, statErr := os.Stat(filePath)
+	if statErr == nil {
+		testLimitsCacheMu.Lock()
+		entry, exists := testLimitsCache[filePath]
+		testLimitsCacheMu.Unlock()
+		if exists && entry.modTime.Equal(info.ModTime()) && entry.size == info.Size() {
+			return entry.limits, nil
+		}
+	}
+
 	// Read the file
 	data, err := os.ReadFile(filePath)
 	if err != nil {
@@ -100,6 +126,16 @@ func LoadTestLimitsFromFile(filePath string) (*TestLimits, error) {
 	}
 	logger.Infof("Test configs: %+v", testLimits)
 
+	if statErr == nil {
+		testLimitsCacheMu.Lock()
+		testLimitsCache[filePath] = testLimitsCacheEntry{
+			modTime: info.ModTime(),
+			size:    info.Size(),
+			limits:  &testLimits,
+		}
+		testLimitsCacheMu.Unlock()
+	}
+
 	return &testLimits, nil
 }
 
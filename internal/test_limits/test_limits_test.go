@@ -1,8 +1,10 @@
 package test_limits
 
 import (
+	"os"
 	"path/filepath"
 	"testing"
+	"time"
 )
 
 func TestLoadTestLimits(t *testing.T) {
@@ -45,6 +47,50 @@ func TestLoadTestLimitsFromFile(t *testing.T) {
 	}
 }
 
+func TestLoadTestLimitsFromFileCache(t *testing.T) {
+	filePath := filepath.Join(t.TempDir(), "test_limits.json")
+	first := `{"test_limits": {"BM.GPU.H100.8": {"gpu_count_check": {"enabled": true, "test_category": "LEVEL_1"}}}}`
+	if err := os.WriteFile(filePath, []byte(first), 0644); err != nil {
+		t.Fatalf("Failed to write test limits file: %v", err)
+	}
+
+	limits, err := LoadTestLimitsFromFile(filePath)
+	if err != nil {
+		t.Fatalf("Failed to load test limits from file: %v", err)
+	}
+
+	// An unchanged file returns the cached parse
+	cached, err := LoadTestLimitsFromFile(filePath)
+	if err != nil {
+		t.Fatalf("Failed to load cached test limits: %v", err)
+	}
+	if cached != limits {
+		t.Error("Expected cached test limits for unchanged file")
+	}
+
+	// A modified file is parsed again
+	second := `{"test_limits": {"BM.GPU.H100.8": {"gpu_count_check": {"enabled": false, "test_category": "LEVEL_1"}}}}`
+	if err := os.WriteFile(filePath, []byte(second), 0644); err != nil {
+		t.Fatalf("Failed to rewrite test limits file: %v", err)
+	}
+	later := time.Now().Add(time.Minute)
+	if err := os.Chtimes(filePath, later, later); err != nil {
+		t.Fatalf("Failed to update file time: %v", err)
+	}
+
+	reloaded, err := LoadTestLimitsFromFile(filePath)
+	if err != nil {
+		t.Fatalf("Failed to reload test limits: %v", err)
+	}
+	enabled, err := reloaded.IsTestEnabled("BM.GPU.H100.8", "gpu_count_check")
+	if err != nil {
+		t.Fatalf("Failed to check test status: %v", err)
+	}
+	if enabled {
+		t.Error("Expected reloaded test limits to reflect the modified file")
+	}
+}
+
 func TestGetTestConfig(t *testing.T) {
 	limits, err := LoadTestLimits()
 	if err != nil {
@@ -0,0 +1,80 @@
+"""
+# Shared helper that lists every PCI device with a single `sudo lspci -vmmnnD` call. The
+# result is memoized per process, so checks running in the same process (see run_all.py)
+# spawn lspci once; the PCI topology does not change while they run.
+# lspci_lines() and lspci_columns() return None if lspci fails so callers can run their own query.
+"""
+
+import functools
+import subprocess
+import threading
+
+LSPCI_BIN = "/usr/sbin/lspci"
+
+
+# Checks may run concurrently (see run_all.py); the lock makes the first caller run the
+# command while the others wait for its memoized result
+_lock = threading.Lock()
+
+
+# Function to run a function under the module lock
+def locked(function):
+    @functools.wraps(function)
+    def wrapper():
+        with _lock:
+            return function()
+    return wrapper
+
+
+# Function to run lspci once per process and return its output lines, or None on failure.
+# Records are separated by blank lines, with one "<Field>:\t<value>" line per field
+@locked
+@functools.lru_cache(maxsize=1)
+def lspci_lines():
+    cmd = ["sudo", LSPCI_BIN, "-vmmnnD"]
+    try:
+        results = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return tuple(results.stdout.decode('utf8', errors='replace').splitlines())
+
+
+# Function to parse `lspci -vmm` output into columns: a list per field name (Slot, Class,
+# Vendor, ...) with one value per device, "" where a device has no such field
+def parse_lspci_columns(lines):
+    columns = {}
+    count = 0
+    in_record = False
+    for line in lines:
+        if not line.strip():
+            if in_record:
+                count += 1
+                in_record = False
+            continue
+        key, sep, value = line.partition(":")
+        if sep:
+            column = columns.setdefault(key, [])
+            column.extend([""] * (count - len(column)))
+            column.append(value.strip())
+            in_record = True
+    if in_record:
+        count += 1
+    for column in columns.values():
+        column.extend([""] * (count - len(column)))
+    return columns
+
+
+# Function to parse the lspci output once per process into columns, or return None on failure.
+# Each check reads only the columns it needs
+@functools.lru_cache(maxsize=1)
+def lspci_columns():
+    lines = lspci_lines()
+    if lines is None:
+        return None
+    return parse_lspci_columns(lines)
+
+
+# Function to drop the memoized listing, so the next lookup runs lspci again
+def clear_cache():
+    lspci_lines.__wrapped__.cache_clear()
+    lspci_columns.cache_clear()
@@ -0,0 +1,55 @@
+"""
+# Shared helper that answers the per-GPU nvidia-smi queries of the GPU checks with a single
+# `nvidia-smi --query-gpu=<all fields> --format=csv,noheader` call. The result is memoized per
+# process, so checks running in the same process (see run_all.py) spawn nvidia-smi once.
+# query_columns() returns None if the batched query fails so callers can run their own query.
+"""
+
+import functools
+import subprocess
+import threading
+
+# Fields requested by the batched query, the union of what the GPU checks need
+BATCH_FIELDS = ("index", "pci.bus_id", "driver_version", "clocks.current.graphics", "mig.mode.current")
+
+# Checks may run concurrently (see run_all.py); the lock makes the first caller run the
+# command while the others wait for its memoized result
+_lock = threading.Lock()
+
+
+# Function to run a function under the module lock
+def locked(function):
+    @functools.wraps(function)
+    def wrapper():
+        with _lock:
+            return function()
+    return wrapper
+
+
+# Function to run the batched query once per process and return its rows, or None on failure
+@locked
+@functools.lru_cache(maxsize=1)
+def query_all():
+    cmd = ["nvidia-smi", f"--query-gpu={','.join(BATCH_FIELDS)}", "--format=csv,noheader"]
+    try:
+        results = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    rows = tuple(line.split(", ") for line in results.stdout.decode('utf8').splitlines() if line)
+    if any(len(row) != len(BATCH_FIELDS) for row in rows):
+        return None
+    return rows
+
+
+# Function to get lines formatted as `nvidia-smi --query-gpu=<fields> --format=csv,noheader` prints them
+def query_columns(*fields):
+    rows = query_all()
+    if rows is None:
+        return None
+    positions = [BATCH_FIELDS.index(field) for field in fields]
+    return [", ".join(row[position] for position in positions) for row in rows]
+
+
+# Function to drop the memoized result, so the next query runs nvidia-smi again
+def clear_cache():
+    query_all.__wrapped__.cache_clear()
@@ -0,0 +1,107 @@
+"""
+# Shared helper that answers the ECC and row remapper queries of the GPU memory checks
+# (row_remap_error_check.py, sram_error_check.py) with a single
+# `nvidia-smi -q -x -d ECC,ROW_REMAPPER` call, through sudo unless running as root. The parsed
+# result is memoized per process, so checks running in the same process spawn nvidia-smi once.
+# Every helper returns None if the query fails so callers can run their own query.
+"""
+
+import functools
+import os
+import subprocess
+import threading
+import xml.etree.ElementTree as ET
+
+
+# Commands that need root are prefixed with sudo, unless the check already runs as root
+SUDO = () if os.geteuid() == 0 else ('sudo',)
+
+
+# Checks may run concurrently (see run_all.py); the lock makes the first caller run the
+# command while the others wait for its memoized result
+_lock = threading.Lock()
+
+
+# Function to run a function under the module lock
+def locked(function):
+    @functools.wraps(function)
+    def wrapper():
+        with _lock:
+            return function()
+    return wrapper
+
+
+# Function to run the query once per process and return one dict per GPU with its bus ID,
+# remapped row failure and aggregate SRAM counts, or None on failure. Missing values are None
+@locked
+@functools.lru_cache(maxsize=1)
+def query_snapshot():
+    cmd = [*SUDO, "nvidia-smi", "-q", "-x", "-d", "ECC,ROW_REMAPPER"]
+    gpus = []
+    try:
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              close_fds=False) as proc:
+            for _, gpu in ET.iterparse(proc.stdout):
+                if gpu.tag == "gpu":
+                    gpus.append({
+                        "bus_id": gpu.get("id"),
+                        "remapped_row_failure": gpu.findtext("remapped_rows/remapped_row_failure"),
+                        "sram_correctable": gpu.findtext("ecc_errors/aggregate/sram_correctable"),
+                        "sram_uncorrectable": gpu.findtext("ecc_errors/aggregate/sram_uncorrectable"),
+                        "sram_uncorrectable_parity": gpu.findtext("ecc_errors/aggregate/sram_uncorrectable_parity"),
+                        "sram_uncorrectable_secded": gpu.findtext("ecc_errors/aggregate/sram_uncorrectable_secded"),
+                    })
+                    gpu.clear()
+    except (OSError, ET.ParseError):
+        return None
+    if proc.returncode != 0 or not gpus:
+        return None
+    return tuple(gpus)
+
+
+# Function to convert a counter value to an int, or None when it is not a count (e.g. "N/A")
+def to_count(value):
+    value = value.strip()
+    return int(value) if value.isascii() and value.isdigit() else None
+
+
+# Function to get "<bus id>, <remapped row failure>" for each GPU, as
+# nvidia-smi --query-remapped-rows=gpu_bus_id,remapped_rows.failure --format=csv,noheader,nounits prints it
+def remapped_row_failures():
+    gpus = query_snapshot()
+    if gpus is None or any(gpu["remapped_row_failure"] is None for gpu in gpus):
+        return None
+    # The XML report says Yes/No where the CSV query prints 1/0
+    failure_values = {"No": "0", "Yes": "1"}
+    return [f"{gpu['bus_id']}, {failure_values.get(gpu['remapped_row_failure'].strip(), gpu['remapped_row_failure'])}"
+            for gpu in gpus]
+
+
+# Function to get the aggregate SRAM error counts of each GPU as (uncorrectable list,
+# correctable list) of ints, None where a GPU reports no count ("N/A"). Parity errors are added to SEC-DED errors for the total
+# uncorrectable count; drivers that do not split them report a single sram_uncorrectable count
+def sram_ecc_counts():
+    gpus = query_snapshot()
+    if gpus is None:
+        return None
+    uncorrectable = []
+    correctable = []
+    for gpu in gpus:
+        secded = gpu["sram_uncorrectable_secded"]
+        if secded is not None:
+            count = to_count(secded)
+            parity = to_count(gpu["sram_uncorrectable_parity"] or "0")
+            if count is not None and parity is not None:
+                count += parity
+            uncorrectable.append(count)
+        elif gpu["sram_uncorrectable"] is not None:
+            uncorrectable.append(to_count(gpu["sram_uncorrectable"]))
+        if gpu["sram_correctable"] is not None:
+            correctable.append(to_count(gpu["sram_correctable"]))
+    return uncorrectable, correctable
+
+
+# Function to drop the memoized query result, so the next lookup runs nvidia-smi again
+def clear_cache():
+    query_snapshot.__wrapped__.cache_clear()
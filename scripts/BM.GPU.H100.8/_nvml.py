@@ -0,0 +1,155 @@
+"""
+# Shared helpers for the optional pynvml (nvidia-ml-py) bindings used by the GPU checks.
+# NVML is initialized once per process and shut down at exit. Every helper returns None
+# when the bindings or the driver are unavailable so callers can fall back to nvidia-smi.
+"""
+
+import atexit
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+_nvml_ready = None
+
+
+# Function to initialize NVML once and return the bindings, or None if NVML is unavailable
+def get_nvml():
+    global _nvml_ready
+    if _nvml_ready is None:
+        _nvml_ready = False
+        if pynvml is not None:
+            try:
+                pynvml.nvmlInit()
+            except pynvml.NVMLError:
+                return None
+            atexit.register(pynvml.nvmlShutdown)
+            _nvml_ready = True
+    return pynvml if _nvml_ready else None
+
+
+# Older bindings return char arrays as bytes, newer ones as str
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+# Legacy bindings fill busId from the 16-byte buffer ("0000:0F:00.0"); widen the domain
+# to the 8-digit form nvidia-smi prints ("00000000:0F:00.0")
+def _bus_id(pci_info):
+    domain, _, rest = _to_str(pci_info.busId).partition(":")
+    return f"{domain.zfill(8)}:{rest}"
+
+
+# Function to get GPU PCI bus IDs (e.g. "00000000:0F:00.0") in NVML index order
+def get_gpu_bus_ids():
+    nvml = get_nvml()
+    if nvml is None:
+        return None
+    try:
+        return [_bus_id(nvml.nvmlDeviceGetPciInfo(nvml.nvmlDeviceGetHandleByIndex(index)))
+                for index in range(nvml.nvmlDeviceGetCount())]
+    except nvml.NVMLError:
+        return None
+
+
+# Function to get GPU PCI bus IDs and GPU module IDs in NVML index order
+def get_gpu_bus_and_module_ids():
+    nvml = get_nvml()
+    if nvml is None or not hasattr(nvml, "nvmlDeviceGetModuleId"):
+        return None
+    bus_ids = []
+    module_ids = []
+    try:
+        for index in range(nvml.nvmlDeviceGetCount()):
+            handle = nvml.nvmlDeviceGetHandleByIndex(index)
+            bus_ids.append(_bus_id(nvml.nvmlDeviceGetPciInfo(handle)))
+            module_ids.append(str(nvml.nvmlDeviceGetModuleId(handle)))
+    except nvml.NVMLError:
+        return None
+    return bus_ids, module_ids
+
+
+# Function to get the current graphics clock of each GPU in MHz, in NVML index order
+def get_gpu_graphics_clocks():
+    nvml = get_nvml()
+    if nvml is None:
+        return None
+    try:
+        return [nvml.nvmlDeviceGetClockInfo(nvml.nvmlDeviceGetHandleByIndex(index), nvml.NVML_CLOCK_GRAPHICS)
+                for index in range(nvml.nvmlDeviceGetCount())]
+    except nvml.NVMLError:
+        return None
+
+
+# Function to get the driver version once per GPU, as nvidia-smi --query-gpu=driver_version reports it
+def get_gpu_driver_versions():
+    nvml = get_nvml()
+    if nvml is None:
+        return None
+    try:
+        return [_to_str(nvml.nvmlSystemGetDriverVersion())] * nvml.nvmlDeviceGetCount()
+    except nvml.NVMLError:
+        return None
+
+
+# Function to get the current MIG mode of each GPU as nvidia-smi prints it ("Enabled", "Disabled", "[N/A]")
+def get_gpu_mig_modes():
+    nvml = get_nvml()
+    if nvml is None:
+        return None
+    modes = []
+    try:
+        for index in range(nvml.nvmlDeviceGetCount()):
+            handle = nvml.nvmlDeviceGetHandleByIndex(index)
+            try:
+                current_mode, _ = nvml.nvmlDeviceGetMigMode(handle)
+            except nvml.NVMLError_NotSupported:
+                modes.append("[N/A]")
+                continue
+            modes.append("Enabled" if current_mode == nvml.NVML_DEVICE_MIG_ENABLE else "Disabled")
+    except nvml.NVMLError:
+        return None
+    return modes
+
+
+# Function to get "<bus id>, <remapped row failure>" for each GPU, as
+# nvidia-smi --query-remapped-rows=gpu_bus_id,remapped_rows.failure --format=csv,noheader,nounits prints it
+def get_gpu_remapped_row_failures():
+    nvml = get_nvml()
+    if nvml is None or not hasattr(nvml, "nvmlDeviceGetRemappedRows"):
+        return None
+    rows = []
+    try:
+        for index in range(nvml.nvmlDeviceGetCount()):
+            handle = nvml.nvmlDeviceGetHandleByIndex(index)
+            _, _, _, failure_occurred = nvml.nvmlDeviceGetRemappedRows(handle)
+            rows.append(f"{_bus_id(nvml.nvmlDeviceGetPciInfo(handle))}, {int(failure_occurred)}")
+    except nvml.NVMLError:
+        return None
+    return rows
+
+
+# Function to get the aggregate SRAM ECC error counts of each GPU as (uncorrectable list,
+# correctable list) of ints, None where a GPU does not report the counter
+def get_gpu_sram_ecc_counts():
+    nvml = get_nvml()
+    if nvml is None:
+        return None
+    uncorrectable = []
+    correctable = []
+    try:
+        for index in range(nvml.nvmlDeviceGetCount()):
+            handle = nvml.nvmlDeviceGetHandleByIndex(index)
+            for error_type, counts in ((nvml.NVML_MEMORY_ERROR_TYPE_UNCORRECTED, uncorrectable),
+                                       (nvml.NVML_MEMORY_ERROR_TYPE_CORRECTED, correctable)):
+                try:
+                    counts.append(nvml.nvmlDeviceGetMemoryErrorCounter(
+                        handle, error_type, nvml.NVML_AGGREGATE_ECC, nvml.NVML_MEMORY_LOCATION_SRAM))
+                except nvml.NVMLError_NotSupported:
+                    counts.append(None)
+    except nvml.NVMLError:
+        return None
+    return uncorrectable, correctable
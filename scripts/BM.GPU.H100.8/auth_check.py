@@ -3,22 +3,28 @@
 """
 
 import subprocess
-import shlex
 import json
 import shutil
+import functools
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.splitlines()
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True)
+        output = results.stdout.decode('utf8').splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output.decode('utf8', 'replace')}"]
     return output
 
+# Function to look up a binary in PATH once per process
+@functools.lru_cache(maxsize=None)
+def which(name):
+    return shutil.which(name)
+
 # Function to parse authentication status for RDMA interfaces
 def parse_auth_results(interface, wpa_cli_output):
     
@@ -28,7 +34,7 @@ def parse_auth_results(interface, wpa_cli_output):
     }
     
     # Check if wpa_cli command succeeded and has output
-    if not wpa_cli_output or any("Error:" in line for line in wpa_cli_output):
+    if not wpa_cli_output or wpa_cli_output[0].startswith("Error:"):
         result["auth_status"] = "FAIL - Unable to run wpa_cli command"
         return result
     
@@ -46,8 +52,8 @@ def parse_auth_results(interface, wpa_cli_output):
 # Main function to check RDMA interface authentication
 def run_auth_check():
     # Find required binaries
-    ibdev2netdev_bin = shutil.which("ibdev2netdev")
-    wpa_cli_bin = shutil.which("wpa_cli")
+    ibdev2netdev_bin = which("ibdev2netdev")
+    wpa_cli_bin = which("wpa_cli")
     
     if not ibdev2netdev_bin:
         raise FileNotFoundError("Required binary 'ibdev2netdev' not found in PATH.")
@@ -65,34 +71,32 @@ def run_auth_check():
     
     # Get device to interface mapping from ibdev2netdev
     device_dict = {}
-    cmd = f'sudo {ibdev2netdev_bin}'
-    raw_result = run_cmd(cmd)
+    raw_result = run_cmd(['sudo', ibdev2netdev_bin])
     for line in raw_result:
         if len(line.split()) >= 5:
             device = line.split()[0]
             interface = line.split()[4]
             device_dict[device] = interface
 
-    interface_results = []
-    
     # Check only the RDMA devices specified for H100
+    interfaces = []
     for device in rdma_devices:
         if device in device_dict:
             interface = device_dict[device]
             print(f"Checking RDMA device {device} (interface {interface})...")
-            
-            # Run wpa_cli status command for this interface
-            cmd = f'sudo {wpa_cli_bin} -i {interface} status'
-            raw_result = run_cmd(cmd)
-            
-            # Use the full output for authentication check
-            filtered_result = raw_result
-            
-            result = parse_auth_results(interface, filtered_result)
-            interface_results.append(result)
+            interfaces.append(interface)
         else:
             print(f"Warning: RDMA device {device} not found in device mapping")
 
+    # Run wpa_cli status for the interfaces concurrently (bounded), results keep device order.
+    # Each call is a plain "sudo wpa_cli", so sudoers rules that only allow wpa_cli still work
+    cmds = [['sudo', wpa_cli_bin, '-i', interface, 'status'] for interface in interfaces]
+    with ThreadPoolExecutor(max_workers=max(min(len(cmds), 8), 1)) as executor:
+        raw_results = list(executor.map(run_cmd, cmds))
+
+    interface_results = [parse_auth_results(interface, raw_result)
+                         for interface, raw_result in zip(interfaces, raw_results)]
+
     return interface_results
 
 # Main function to call run_auth_check and print results
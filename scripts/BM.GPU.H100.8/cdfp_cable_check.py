@@ -5,18 +5,31 @@
 """
 
 import subprocess
-import shlex
 import json
+import re
+
+# NVML support is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvml import get_gpu_bus_and_module_ids
+except ImportError:
+    def get_gpu_bus_and_module_ids():
+        return None
+
+# Bus Id and Module ID lines of nvidia-smi -q, e.g. "    Bus Id                            : 00000000:0F:00.0"
+GPU_ID_LINE_RE = re.compile(r'^\s*(bus id|module id)\s*:\s*(.*?)\s*$', re.IGNORECASE)
+
+# Module ID values reported when a GPU does not expose its module ID
+MODULE_ID_PLACEHOLDERS = ("", "N/A", "[N/A]", "[Not Supported]")
 
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.splitlines()
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True)
+        output = results.stdout.decode('utf8').splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output.decode('utf8', 'replace')}"]
     return output
 
 # Function to normalize PCI addresses
@@ -24,88 +37,115 @@ def normalize_pci_address(pci_addr):
     """Normalize PCI address format."""
     normalized = pci_addr.lower()
     # Handle cases where PCI address starts with "000000"
-    if pci_addr.startswith("000000"):
-        normalized = "00" + pci_addr[6:].lower()
+    if normalized.startswith("000000"):
+        return "00" + normalized[6:]
     return normalized
 
-# Function to get GPU PCI addresses and module IDs
-def get_gpu_info():
-    """Get GPU PCI addresses and corresponding GPU module IDs using nvidia-smi -q."""
-    # Use nvidia-smi -q to get detailed GPU information
-    query_cmd = 'nvidia-smi -q'
-    
+# Define expected PCI Bus IDs and Module IDs for H100
+CDFP_CONFIG = {
+    "gpu_pci_ids": [
+        "00000000:0f:00.0",
+        "00000000:2d:00.0",
+        "00000000:44:00.0",
+        "00000000:5b:00.0",
+        "00000000:89:00.0",
+        "00000000:a8:00.0",
+        "00000000:c0:00.0",
+        "00000000:d8:00.0"
+    ],
+    "gpu_module_ids": [
+        "2", "4", "3", "1",
+        "7", "5", "8", "6"
+    ]
+}
+
+# Normalized expected PCI address to module ID mapping, computed once at import time
+EXPECTED_PCI_TO_MODULE = {normalize_pci_address(pci): module_id
+                          for pci, module_id in zip(CDFP_CONFIG["gpu_pci_ids"], CDFP_CONFIG["gpu_module_ids"])}
+
+# Function to query GPU PCI addresses and module IDs from nvidia-smi
+def query_gpu_info():
+    # Query PCI bus IDs and module IDs in a single CSV call
+    query_cmd = ['nvidia-smi', '--query-gpu=pci.bus_id,module_id', '--format=csv,noheader,nounits']
+
     query_result = run_cmd(query_cmd)
-    if not query_result or any("Error:" in line for line in query_result):
-        return [], []
-    
+    if not query_result or query_result[0].startswith("Error:"):
+        # Drivers without the module_id query field reject the whole query
+        return query_gpu_info_full()
+
     pci_addresses = []
     module_ids = []
-    
-    # First pass: collect all PCI addresses in order
+
+    # Lines look like "00000000:0F:00.0, 2"
     for line in query_result:
-        line = line.strip()
-        
-        # Look for Bus ID lines
-        if "Bus Id" in line and ":" in line:
-            # Extract Bus ID from lines like "    Bus Id                        : 00000000:0F:00.0"
-            try:
-                # Split on colons and take the last 3 parts to reconstruct the PCI address
-                parts = line.split(":")
-                if len(parts) >= 4:
-                    # Strip whitespace from each part before reconstructing
-                    bus_id = parts[-3].strip() + ":" + parts[-2].strip() + ":" + parts[-1].strip()
-                    if bus_id and bus_id != "::" and bus_id != "":
-                        # Normalize the PCI address
-                        pci_addresses.append(normalize_pci_address(bus_id))
-            except:
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) != 2 or not fields[0]:
+            continue
+        pci_addresses.append(fields[0])
+        module_ids.append(fields[1])
+
+    return pci_addresses, module_ids
+
+# Function to stream GPU PCI addresses and module IDs from the full nvidia-smi -q report
+def query_gpu_info_full(expected_count=len(EXPECTED_PCI_TO_MODULE)):
+    pci_addresses = []
+    module_ids = []
+    complete = False
+
+    # Parse the report as it is produced and stop nvidia-smi once every GPU has been seen
+    with subprocess.Popen(['nvidia-smi', '-q'], stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, encoding='utf8') as proc:
+        for line in proc.stdout:
+            match = GPU_ID_LINE_RE.match(line)
+            if not match:
                 continue
-    
-    # Second pass: collect all module IDs using the exact working command
-    # nvidia-smi -q | grep -i "Module ID" | awk '{print $4}'
-    module_cmd = 'bash -c "nvidia-smi -q | grep -i \\"Module ID\\" | awk \'{print $4}\'"'
-    module_result = run_cmd(module_cmd)
-    
-    for line in module_result:
-        line = line.strip()
-        if line and not line.startswith("Error"):
-            module_ids.append(line)
-    
+            if match.group(1).lower() == "bus id":
+                pci_addresses.append(match.group(2))
+            else:
+                module_ids.append(match.group(2))
+            if len(pci_addresses) >= expected_count and len(module_ids) >= expected_count:
+                complete = True
+                proc.terminate()
+                break
+
+    if not complete and proc.returncode != 0:
+        return [], []
+
+    return pci_addresses, module_ids
+
+# Function to get GPU PCI addresses and module IDs
+def get_gpu_info():
+    """Get GPU PCI addresses and corresponding GPU module IDs using NVML or nvidia-smi."""
+    # Prefer NVML, which answers both queries without spawning nvidia-smi
+    nvml_result = get_gpu_bus_and_module_ids()
+    if nvml_result is not None:
+        pci_addresses, module_ids = nvml_result
+    else:
+        pci_addresses, module_ids = query_gpu_info()
+
+    if not pci_addresses:
+        return [], []
+    pci_addresses = [normalize_pci_address(pci) for pci in pci_addresses]
+
+    module_ids = [module_id for module_id in module_ids if module_id not in MODULE_ID_PLACEHOLDERS]
+
     # If no module IDs found, use sequential numbering
     if len(module_ids) == 0:
         print("No module IDs found, using sequential numbering")
-        for i in range(len(pci_addresses)):
-            module_ids.append(str(i + 1))
-    
+        module_ids = [str(i + 1) for i in range(len(pci_addresses))]
+    elif len(module_ids) != len(pci_addresses):
+        print(f"Mismatch between PCI address count ({len(pci_addresses)}) and module ID count ({len(module_ids)})")
+        return [], []
+
     return pci_addresses, module_ids
 
 # Function to run CDFP cable check
 def run_cdfp_cable_check():
-    # Define expected PCI Bus IDs and Module IDs for H100
-    config = {
-        "gpu_pci_ids": [
-            "00000000:0f:00.0",
-            "00000000:2d:00.0", 
-            "00000000:44:00.0",
-            "00000000:5b:00.0",
-            "00000000:89:00.0",
-            "00000000:a8:00.0",
-            "00000000:c0:00.0",
-            "00000000:d8:00.0"
-        ],
-        "gpu_module_ids": [
-            "2", "4", "3", "1",
-            "7", "5", "8", "6"
-        ]
-    }
-    
-    expected_pci_ids = config["gpu_pci_ids"]
-    expected_gpu_module_ids = config["gpu_module_ids"]
-    
     # Get actual GPU information
     pci_result, module_id_result = get_gpu_info()
     
-    # Parse the CDFP results
-    result = parse_cdfp_results(pci_result, module_id_result, expected_pci_ids, expected_gpu_module_ids)
+    # Parse the CDFP results against the precomputed H100 mapping
+    result = parse_cdfp_results(pci_result, module_id_result)
     return result
 
 # Function to parse CDFP cable results
@@ -120,15 +160,12 @@ def parse_cdfp_results(pci_result=None, module_id_result=None, pci_expected=None
         result["gpu"]["cdfp"] = "FAIL - Missing input data"
         return result
 
-    # Normalize PCI results
-    pci_result_list = []
-    for pci in pci_result:
-        normalized = normalize_pci_address(pci)
-        pci_result_list.append(normalized)
-
-    # Create dictionaries for mapping
-    expected_mapping = dict(zip([normalize_pci_address(pci) for pci in pci_expected], module_id_expected))
-    actual_mapping = dict(zip(pci_result_list, module_id_result))
+    # Create dictionaries for mapping, PCI results are already normalized by get_gpu_info
+    if pci_expected is None and module_id_expected is None:
+        expected_mapping = EXPECTED_PCI_TO_MODULE
+    else:
+        expected_mapping = dict(zip([normalize_pci_address(pci) for pci in pci_expected], module_id_expected))
+    actual_mapping = dict(zip(pci_result, module_id_result))
 
     # Validate each expected PCI and module ID pair
     fail_list = []
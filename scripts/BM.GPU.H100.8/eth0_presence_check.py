@@ -1,27 +1,24 @@
 """
-# This script checks if the eth0 network interface is present on the system by running
-# the `ip addr | grep eth0` command and parsing the output. It returns a JSON object
+# This script checks if the eth0 network interface is present on the system by looking
+# for its entry under /sys/class/net, without running `ip addr`. It returns a JSON object
 # indicating the status of the eth0 presence check, which can be either "PASS" or "FAIL".
 # The script is designed to be run in a HPC environment where the user has the necessary
 # permissions to run network interface commands.
 """
 
-import shlex
-import subprocess
+import os
 import json
 
-# Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
-    try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.splitlines()
-    except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
-    return output
-
-# Function to parse ip addr output and check for eth0 presence
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Every network interface known to the kernel has a directory here
+ETH0_SYSFS_PATH = "/sys/class/net/eth0"
+
+# Function to parse interface names and check for eth0 presence
 def parse_eth0_presence_results(ip_result="undefined"):
     result = {
          "eth0_presence":
@@ -45,15 +42,20 @@ def parse_eth0_presence_results(ip_result="undefined"):
 # Function to run eth0 presence check
 def run_eth0_presence_check():
     """ Run eth0 presence check - checking if eth0 interface exists"""
-    cmd = "ip addr | grep eth0"
-    ip_result = run_cmd(cmd)
+    ip_result = ["eth0"] if os.path.isdir(ETH0_SYSFS_PATH) else []
     return parse_eth0_presence_results(ip_result)
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_eth0_presence_check and parse the results
 def main(argv=None):
     print("Eth0 presence check is in progress and the result will be provided within 1 minute.")
     result = run_eth0_presence_check()
-    print(json.dumps(result, indent=2))
+    print(dumps_pretty(result))
 
 # Run the main function
 if __name__ == "__main__":
@@ -2,37 +2,90 @@
 # This script checks the state of each 100GbE RoCE NIC (non-RDMA Ethernet interfaces).
 """
 
+import os
 import subprocess
-import shlex
 import json
+import re
 import shutil
+import functools
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+# orjson is optional and only used to speed up parsing the mlxlink JSON and JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Integer and float literals as mlxlink prints them, e.g. "0", "-3", "1.5E-12"
+INT_RE = re.compile(r'[-+]?\d+')
+FLOAT_RE = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+# Function to run command and capture output, as str lines or, for JSON consumers, the
+# undecoded bytes payload as a single chunk
+def run_cmd(argv, text=True):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.splitlines()
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8' if text else None)
+        output = results.stdout.splitlines() if text else [results.stdout]
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        if text:
+            return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} ".encode() + e_process_error.output]
     return output
 
-# Helper functions
+# Function to decode mlxlink JSON, the bytes are handed to the parser without decoding
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Commands that need root are prefixed with sudo, unless the check already runs as root
+SUDO = () if os.geteuid() == 0 else ('sudo',)
+
+# Function to look up a binary in PATH once per process
+@functools.lru_cache(maxsize=None)
+def which(name):
+    return shutil.which(name)
+
+# ibdev2netdev mapping is reused for this many seconds within a process
+DEVICE_MAP_TTL = 30
+_device_map_cache = {"time": 0.0, "map": None}
+
+# Function to get the RDMA device to interface mapping from ibdev2netdev
+def get_device_map(ibdev2netdev_bin):
+    now = time.monotonic()
+    if _device_map_cache["map"] is None or now - _device_map_cache["time"] > DEVICE_MAP_TTL:
+        device_dict = {}
+        cmd = [*SUDO, ibdev2netdev_bin]
+        raw_result = run_cmd(cmd)
+        for line in raw_result:
+            fields = line.split()
+            if len(fields) >= 5:
+                device_dict[fields[0]] = fields[4]
+        # Do not hold on to an empty mapping from a failed run
+        if not device_dict:
+            return device_dict
+        _device_map_cache["time"] = now
+        _device_map_cache["map"] = device_dict
+    return _device_map_cache["map"]
+
+# Function to join output lines into one buffer, as bytes whether they were decoded or not.
+# A single bytes chunk is returned as is, without a copy
+def join_lines(lines):
+    return b''.join(line.encode() if isinstance(line, str) else line for line in lines)
+
+# Helper functions, matched against precompiled patterns instead of try/except
 def isfloat(val):
-    try:
-        float(val)
-        return True
-    except Exception:
-        return False
+    if isinstance(val, str):
+        return FLOAT_RE.fullmatch(val.strip()) is not None
+    return isinstance(val, (int, float))
 
 def isint(val):
-    try:
-        int(val)
-        return True
-    except Exception:
-        return False
+    if isinstance(val, str):
+        return INT_RE.fullmatch(val.strip()) is not None
+    return isinstance(val, int)
 
 def parse_raw_physical_errors_per_lane(val):
     if isinstance(val, list):
@@ -53,7 +106,7 @@ def parse_eth_link_results(interface, results, expected_speed, expected_width,
     expected_phys_state = ["LinkUp", "ETH_AN_FSM_ENABLE"]
 
     try:
-        output = json.loads(''.join(results))["result"]["output"]
+        output = json_loads(join_lines(results))["result"]["output"]
     except json.JSONDecodeError:
         return {
             "device": interface,
@@ -68,17 +121,21 @@ def parse_eth_link_results(interface, results, expected_speed, expected_width,
             "raw_physical_ber": f"FAIL - Unable to parse mlxlink output"
         }
     
-    speed = output["Operational Info"]["Speed"]
-    state = output["Operational Info"]["State"]
-    phys_state = output["Operational Info"]["Physical state"]
-    width = output["Operational Info"]["Width"]
-    status_opcode = output["Troubleshooting Info"]["Status Opcode"]
-    recommendation = output["Troubleshooting Info"]["Recommendation"]
-    effective_physical_errors = output["Physical Counters and BER Info"]["Effective Physical Errors"]
-    effective_physical_ber = output["Physical Counters and BER Info"]["Effective Physical BER"]
+    # Look up the three sections that are read once, then take their fields
+    operational_info = output["Operational Info"]
+    troubleshooting_info = output["Troubleshooting Info"]
+    counters_info = output["Physical Counters and BER Info"]
+    speed = operational_info["Speed"]
+    state = operational_info["State"]
+    phys_state = operational_info["Physical state"]
+    width = operational_info["Width"]
+    status_opcode = troubleshooting_info["Status Opcode"]
+    recommendation = troubleshooting_info["Recommendation"]
+    effective_physical_errors = counters_info["Effective Physical Errors"]
+    effective_physical_ber = counters_info["Effective Physical BER"]
     raw_physical_errors_per_lane = parse_raw_physical_errors_per_lane(
-        output["Physical Counters and BER Info"]["Raw Physical Errors Per Lane"])
-    raw_physical_ber = output["Physical Counters and BER Info"]["Raw Physical BER"]
+        counters_info["Raw Physical Errors Per Lane"])
+    raw_physical_ber = counters_info["Raw Physical BER"]
 
     result = {
         "device": interface,
@@ -150,9 +207,9 @@ def run_eth_link_check():
     raw_physical_ber_threshold = config["eth_link_check"]["raw_physical_ber"]
 
     # Find binaries in the OS
-    ibdev2netdev_bin = shutil.which("ibdev2netdev")
-    mlxlink_bin = shutil.which("mlxlink")
-    mst_bin = shutil.which("mst")
+    ibdev2netdev_bin = which("ibdev2netdev")
+    mlxlink_bin = which("mlxlink")
+    mst_bin = which("mst")
     
     if not ibdev2netdev_bin or not mlxlink_bin or not mst_bin:
         raise FileNotFoundError("Required binaries 'ibdev2netdev', 'mlxlink', or 'mst' not found in PATH.")
@@ -162,44 +219,44 @@ def run_eth_link_check():
     vcn_devices = ["mlx5_2", "mlx5_11"]
     
     # Get device to interface mapping from ibdev2netdev
-    device_dict = {}
-    cmd = f'sudo {ibdev2netdev_bin}'
-    raw_result = run_cmd(cmd)
-    for line in raw_result:
-        if len(line.split()) >= 5:
-            device = line.split()[0]
-            interface = line.split()[4]
-            device_dict[device] = interface
-
-    interface_results = []
-    
+    device_dict = get_device_map(ibdev2netdev_bin)
+
     # Check only the VCN devices specified for H100
+    devices = []
     for device in vcn_devices:
         if device in device_dict:
-            interface = device_dict[device]
-            print(f"Checking VCN device {device} (interface {interface})...")
-            
-            cmd = f'sudo {mlxlink_bin} -d {device} --json --show_module --show_counters --show_eye'
-            raw_result = run_cmd(cmd)
-            
-            result = parse_eth_link_results(
-                interface, raw_result, expected_speed, expected_width,
-                raw_physical_errors_per_lane_threshold,
-                effective_physical_errors_threshold,
-                raw_physical_ber_threshold,
-                effective_physical_ber_threshold
-            )
-            interface_results.append(result)
+            print(f"Checking VCN device {device} (interface {device_dict[device]})...")
+            devices.append(device)
         else:
             print(f"Warning: VCN device {device} not found in device mapping")
 
+    # Run mlxlink for the devices concurrently (bounded), results keep device order.
+    # Only the operational, troubleshooting and counter sections are read
+    cmds = [[*SUDO, mlxlink_bin, '-d', device, '--json', '--show_counters'] for device in devices]
+    with ThreadPoolExecutor(max_workers=max(min(len(cmds), 8), 1)) as executor:
+        raw_results = list(executor.map(functools.partial(run_cmd, text=False), cmds))
+
+    interface_results = [parse_eth_link_results(
+                             device_dict[device], raw_result, expected_speed, expected_width,
+                             raw_physical_errors_per_lane_threshold,
+                             effective_physical_errors_threshold,
+                             raw_physical_ber_threshold,
+                             effective_physical_ber_threshold)
+                         for device, raw_result in zip(devices, raw_results)]
+
     return interface_results
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_eth_link_check and print results
 def main(argv=None):
     print("Ethernet link health check is in progress ...")
     result = run_eth_link_check()
-    print(json.dumps({"eth_link": result}, indent=2))
+    print(dumps_pretty({"eth_link": result}))
 
 # Run the main function
 if __name__ == "__main__":
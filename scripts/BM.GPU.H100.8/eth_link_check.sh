@@ -44,7 +44,8 @@ for device in "${VCN_DEVICES[@]}"; do
   
   if [[ -n "$interface" ]]; then
     echo "Checking VCN device $device (interface $interface)..."
-    output=$(sudo "$MLXLINK_BIN" -d "$device" --json --show_module --show_counters --show_eye 2>&1)
+    # Only the operational, troubleshooting and counter sections are read
+    output=$(sudo "$MLXLINK_BIN" -d "$device" --json --show_counters 2>&1)
     
     # Try to extract JSON from output
     json_part=$(echo "$output" | awk '/{/{flag=1}flag')
@@ -5,45 +5,41 @@
 """
 
 import subprocess
-import shlex
 import json
 
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
     return output
 
 # Function to check nvidia-fabricmanager service status
 def check_fabricmanager_service():
     """Check if nvidia-fabricmanager service is active and running."""
-    cmd = 'systemctl status nvidia-fabricmanager'
+    # is-active prints only the unit state and skips the journal read done by status
+    cmd = ['systemctl', 'is-active', 'nvidia-fabricmanager']
     
     result = run_cmd(cmd)
     if not result:
-        return False, "No output from systemctl status command"
-    
-    # Check for active (running) status
-    for line in result:
-        if "active (running)" in line.lower():
-            return True, "nvidia-fabricmanager service is active and running"
+        return False, "No output from systemctl is-active command"
     
-    # If not active, check what the actual status is
-    status_info = []
-    for line in result:
-        line = line.strip()
-        if "Active:" in line or "Main PID:" in line or "Status:" in line:
-            status_info.append(line)
+    # A non-zero exit comes back as an error line ending in the state, e.g. "... 3 inactive"
+    state = result[-1].split()[-1] if result[-1].split() else "unknown"
+    if state == "active":
+        return True, "nvidia-fabricmanager service is active and running"
     
-    if status_info:
-        return False, "; ".join(status_info)
-    else:
-        return False, "nvidia-fabricmanager service is not active"
+    return False, f"nvidia-fabricmanager service is not active (state: {state})"
 
 # Function to run fabricmanager check
 def run_fabricmanager_check():
@@ -73,12 +69,18 @@ def parse_fabricmanager_results(raw_result=None, details=""):
 
     return result
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_fabricmanager_check and parse the results  
 def main(argv=None):
     print("Health check is in progress ...")
     result, details = run_fabricmanager_check()
     parsed_result = parse_fabricmanager_results(result, details)
-    print(json.dumps(parsed_result, indent=2))
+    print(dumps_pretty(parsed_result))
 
 # Run the main function
 if __name__ == "__main__":
@@ -6,44 +6,31 @@
 # and discrepancies can lead to performance issues."""
 
 import subprocess
-import shlex
 import json
 
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-# Execute a system command safely with automatic shell detection.
-def run_cmd(cmd=None):
-    # Split command into arguments for security (prevents injection)
-    cmd_split = shlex.split(cmd)
 
+# Execute a system command given as an argument list, without a shell.
+def run_cmd(argv=None):
     try:
-        # Auto-detect if shell features are needed
-        if '|' in cmd_split or '&&' in cmd_split:
-            # Use shell mode for pipes and logical operators
-            results = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        else:
-            # Use safer non-shell mode for simple commands
-            results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, check=True, encoding='utf8')
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
 
         # Split output into individual lines for easier processing
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
         # Return error information if command fails
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
 
     return output
 
 
-# Check if a string represents a valid integer.
-def isint(num):
-    try:
-        int(num)
-        return True
-    except ValueError:
-        return False
-
-
 # Run GID index check - some interfaces report a GID index of 4 instead of 0,1,2,3 as expected.
 def run_gid_index_check():
     """ This change in GID indices can have an impact on workloads that expect the default values."""
@@ -51,8 +38,9 @@ def run_gid_index_check():
     config = {
         "gid_index_check": [0, 1, 2, 3]
     }
-    cmd = f'sudo show_gids | tail -n +3 | head -n -1'
-    gid_index_result = run_cmd(cmd)
+    cmd = ['sudo', 'show_gids']
+    # Drop the two header lines and the trailing n_gids_found summary line
+    gid_index_result = run_cmd(cmd)[2:-1]
     gid_index_check_threshold = config["gid_index_check"]
     return parse_gid_index_results(gid_index_result, gid_index_check_threshold)
 
@@ -68,19 +56,26 @@ def parse_gid_index_results(gid_index_result=None, gid_index_check_threshold=[0,
             "gid_index":
                 {"status": "FAIL"}
         }
-    for line in gid_index_result:
-        gid_index = line.split()[2]
-        if isint(gid_index):
-            if int(gid_index) not in gid_index_check_threshold:
-                result["gid_index"]["status"] = "FAIL"
+    # Compare the INDEX column as text against the allowed indices, no int parsing needed
+    allowed_indices = frozenset(map(str, gid_index_check_threshold))
+    if any(fields[2] not in allowed_indices
+           for fields in (line.split() for line in gid_index_result) if len(fields) > 2):
+        result["gid_index"]["status"] = "FAIL"
     return result
 
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+
 # Main entry point for the RX discards health check script.
 def main():
     print("Health check is in progress ...")
     result = run_gid_index_check()
-    print(json.dumps(result, indent=2))
+    print(dumps_pretty(result))
 
 
 # Script entry point - only execute main() when script is run directly
@@ -3,18 +3,37 @@
 """
 
 import subprocess
-import shlex
 import json
 
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# NVML support is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvml import get_gpu_graphics_clocks
+except ImportError:
+    def get_gpu_graphics_clocks():
+        return None
+
+# The batched nvidia-smi query is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvidia_smi_batch import query_columns
+except ImportError:
+    def query_columns(*fields):
+        return None
+
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
     return output
 
 # Function to parse nvidia-smi output and emit JSON
@@ -27,8 +46,14 @@ def run_gpu_clk_check():
         }
     }
     max_clock_speed = config["gpu_clk_check"]["clock_speed"]
-    cmd = f'nvidia-smi --query-gpu=clocks.current.graphics --format=csv,noheader'
-    output = run_cmd(cmd)
+    # Prefer NVML, then the batched GPU query, then a dedicated nvidia-smi call
+    clocks = get_gpu_graphics_clocks()
+    output = None if clocks is None else [f"{clock} MHz" for clock in clocks]
+    if output is None:
+        output = query_columns("clocks.current.graphics")
+    if output is None:
+        cmd = ['nvidia-smi', '--query-gpu=clocks.current.graphics', '--format=csv,noheader']
+        output = run_cmd(cmd)
     result = parse_gpu_clk_results(output, max_clock_speed)
     return result
 
@@ -41,12 +66,17 @@ def parse_gpu_clk_results(results="undefined", max_clock_speed="undefined"):
     }
     fail_list = []
     warn_list = []
-    gpu = 0
     original_max_clock_speed = max_clock_speed
-    allowed_max_clock_speed = ""
     if not results:
         result["gpu"]["max_clock_speed"] = "FAIL - check GPU "
-    for line in results:
+    # Allow for an offset for H100, thresholds are converted once
+    original_max_clock = int(original_max_clock_speed)
+    max_clock = original_max_clock - round(original_max_clock * 0.10)
+    current_speed = ""
+    allowed_speed = ""
+    allowed_clock = None
+    # Single pass: stop on nvidia-smi errors, otherwise check each GPU clock as it is read
+    for gpu, line in enumerate(results):
         if "couldn't communicate with the NVIDIA driver" in line:
             result["gpu"]["max_clock_speed"] = "FAIL - NVIDIA driver is not loaded"
             return result
@@ -54,22 +84,21 @@ def parse_gpu_clk_results(results="undefined", max_clock_speed="undefined"):
             result["gpu"]["max_clock_speed"] = "FAIL - not able to run command 'nvidia-smi " \
                                                "--query-gpu=clocks.current.graphics --format=csv' "
             return result
-    # Allow for an offset for H100
-    max_clock_speed = str(int(original_max_clock_speed) - round(int(original_max_clock_speed) * 0.10))
-    current_speed = ""
-    allowed_speed = ""
-    for line in results:
-        if len(line) > 0:
-            current_speed = line.split()[0]
-            # Include the smallest allowed clock among all GPU clocks for allowed message
-            if int(current_speed) >= int(max_clock_speed) and int(current_speed) < int(original_max_clock_speed):
-                allowed_speed = str(min(int(allowed_speed), int(current_speed))) if allowed_speed else current_speed
-            try:
-                if int(current_speed) < int(max_clock_speed):
-                    fail_list.append(str(gpu))
-            except ValueError:
-                fail_list.append(str(gpu))
-        gpu += 1
+        if len(line) == 0:
+            continue
+        current_speed = line.split()[0]
+        try:
+            current_clock = int(current_speed)
+        except ValueError:
+            fail_list.append(str(gpu))
+            continue
+        if current_clock < max_clock:
+            fail_list.append(str(gpu))
+        # Include the smallest allowed clock among all GPU clocks for allowed message
+        elif current_clock < original_max_clock:
+            allowed_clock = current_clock if allowed_clock is None else min(allowed_clock, current_clock)
+    if allowed_clock is not None:
+        allowed_speed = str(allowed_clock)
     if fail_list:
         result["gpu"]["max_clock_speed"] = "FAIL - check GPU " + ",".join(iter(fail_list))
     else:
@@ -81,10 +110,16 @@ def parse_gpu_clk_results(results="undefined", max_clock_speed="undefined"):
             result["gpu"]["max_clock_speed"] = f"PASS - Expected {original_max_clock_speed}, " f"allowed {allowed_speed}"
     return result
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_gpu_clk_check and parse the results
 def main(argv=None):
     result = run_gpu_clk_check()
-    print(json.dumps(result, indent=2))
+    print(dumps_pretty(result))
 
 # Run the main function
 if __name__ == "__main__":
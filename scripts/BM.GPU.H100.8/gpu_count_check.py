@@ -5,60 +5,104 @@
 """
 
 import subprocess
-import shlex
 import json
 
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# NVML support is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvml import get_gpu_bus_ids
+except ImportError:
+    def get_gpu_bus_ids():
+        return None
+
+# The batched nvidia-smi query is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvidia_smi_batch import query_columns
+except ImportError:
+    def query_columns(*fields):
+        return None
+
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.splitlines()
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True)
+        output = results.stdout.decode('utf8').splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output.decode('utf8', 'replace')}"]
     return output
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+# Define PCI Bus IDs for H100
+GPU_COUNT_CONFIG = {
+    "pci_bus_ids": [
+        "00000000:0F:00.0",
+        "00000000:2D:00.0",
+        "00000000:44:00.0",
+        "00000000:89:00.0",
+        "00000000:5B:00.0",
+        "00000000:A8:00.0",
+        "00000000:C0:00.0",
+        "00000000:D8:00.0"
+    ]
+}
+
+# Lowercased expected bus IDs in config order, and as a set for lookups, computed once at import time
+EXPECTED_BUS_IDS = tuple(busid.lower() for busid in GPU_COUNT_CONFIG["pci_bus_ids"])
+EXPECTED_BUS_ID_SET = frozenset(EXPECTED_BUS_IDS)
+
 # Function to parse nvidia-smi output and emit JSON
 def run_gpu_count_check():
     # Define the path to nvidia-smi
     nvidia_smi_bin = "/usr/bin/nvidia-smi"
 
-    # Define PCI Bus IDs for H100
-    config = {
-        "pci_bus_ids": [
-            "00000000:0F:00.0",
-            "00000000:2D:00.0",
-            "00000000:44:00.0",
-            "00000000:89:00.0",
-            "00000000:5B:00.0",
-            "00000000:A8:00.0",
-            "00000000:C0:00.0",
-            "00000000:D8:00.0"
-        ]
-    }
-
-    known_pci_busid = config["pci_bus_ids"]
-    cmd = f'{nvidia_smi_bin} --query-gpu=pci.bus_id --format=csv,noheader'
-    raw_result = run_cmd(cmd)
-    result = parse_gpu_count_results(raw_result, known_pci_busid)
+    # Prefer NVML, then the batched GPU query, then a dedicated nvidia-smi call
+    raw_result = get_gpu_bus_ids()
+    if raw_result is None:
+        raw_result = query_columns("pci.bus_id")
+    if raw_result is None:
+        cmd = [nvidia_smi_bin, '--query-gpu=pci.bus_id', '--format=csv,noheader']
+        raw_result = run_cmd(cmd)
+    # Check against the precomputed H100 bus IDs
+    result = parse_gpu_count_results(raw_result)
     return result
 
 # Function to parse GPU count results and check against expected bus IDs
-def parse_gpu_count_results(raw_result="undefined", known_gpu_busids="undefined"):
+def parse_gpu_count_results(raw_result="undefined", known_gpu_busids=None):
     result = {
         "gpu":
             {"device_count": "FAIL"}
     }
     fail_list = []
-    gpu_bus_ids= [busid.lower() for busid in known_gpu_busids]
+    if known_gpu_busids is None:
+        gpu_bus_ids = EXPECTED_BUS_IDS
+        known_bus_ids = EXPECTED_BUS_ID_SET
+    else:
+        gpu_bus_ids = [busid.lower() for busid in known_gpu_busids]
+        known_bus_ids = set(gpu_bus_ids)
     expected_gpu_count = len(gpu_bus_ids)
-    gpu_count_result = len([item for item in raw_result if item != ''])
-    parsed_results = []
 
+    # Count GPUs and collect unknown bus IDs in a single pass
+    gpu_count_result = 0
+    found_bus_ids = set()
     for line in raw_result:
-        parsed_results.append(line)
-        if len(line) > 0 and line.lower() not in gpu_bus_ids:
+        if len(line) == 0:
+            continue
+        gpu_count_result += 1
+        busid = line.lower()
+        found_bus_ids.add(busid)
+        if busid not in known_bus_ids:
             fail_list.append(line)
     if not fail_list and expected_gpu_count == gpu_count_result:
         result["gpu"]["device_count"] = "PASS"
@@ -68,7 +112,7 @@ def parse_gpu_count_results(raw_result="undefined", known_gpu_busids="undefined"
             fail_ids = ",".join(iter(fail_list))
         else:
             fail_type = "missing"
-            fail_ids = ",".join(iter(set(gpu_bus_ids) - set(parsed_results)))
+            fail_ids = ",".join(busid for busid in gpu_bus_ids if busid not in found_bus_ids)
         result["gpu"]["device_count"] = f"FAIL - {fail_type}: {fail_ids}"
 
     return result
@@ -77,7 +121,7 @@ def parse_gpu_count_results(raw_result="undefined", known_gpu_busids="undefined"
 def main(argv=None):
     print("Health check is in progress ...")
     result = run_gpu_count_check()
-    print(json.dumps(result, indent=2))
+    print(dumps_pretty(result))
 
 # Run the main function
 if __name__ == "__main__":
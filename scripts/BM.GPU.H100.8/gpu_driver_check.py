@@ -5,20 +5,39 @@ Blacklisted versions: "470.57.02"
 Supported versions: "450.119.03", "450.142.0", "470.103.01", "470.129.06", "470.141.03", "510.47.03", "535.104.12", "550.90.12"
 """
 
-import shlex
 import subprocess
 import json
 
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# NVML support is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvml import get_gpu_driver_versions
+except ImportError:
+    def get_gpu_driver_versions():
+        return None
+
+# The batched nvidia-smi query is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvidia_smi_batch import query_columns
+except ImportError:
+    def query_columns(*fields):
+        return None
+
 
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
     return output
 
 # Function to call nvidia-smi to determine GPU driver version
@@ -32,11 +51,17 @@ def run_gpu_driver_check():
                                    "510.47.03", "535.104.12", "550.90.12"]
         }
     }
-    bad_driver_list = config["gpu_driver_check"]["blacklisted_versions"]
-    supported_driver_list = config["gpu_driver_check"]["supported_versions"]
+    # Version lists become sets for constant-time membership tests
+    bad_driver_list = frozenset(config["gpu_driver_check"]["blacklisted_versions"])
+    supported_driver_list = frozenset(config["gpu_driver_check"]["supported_versions"])
 
-    cmd = f'nvidia-smi --query-gpu=driver_version --format=csv,noheader'
-    output = run_cmd(cmd)
+    # Prefer NVML, then the batched GPU query, then a dedicated nvidia-smi call
+    output = get_gpu_driver_versions()
+    if output is None:
+        output = query_columns("driver_version")
+    if output is None:
+        cmd = ['nvidia-smi', '--query-gpu=driver_version', '--format=csv,noheader']
+        output = run_cmd(cmd)
     result = parse_gpu_driver_results(output, bad_driver_list, supported_driver_list)
     return result
 
@@ -50,10 +75,10 @@ def parse_gpu_driver_results(results="undefined", driver_blacklist="undefined",
     results = [item for item in results if item != '']
     if len(results) == 0:
         return result
+    versions = set(results)
     current_version = results[0]
-    all_same_version = results.count(current_version) == len(results)
     # This should never happen, but let's double check all driver versions are the same
-    if not all_same_version:
+    if len(versions) != 1:
         result["gpu"]["driver_version"] = "FAIL - Driver versions are mismatched"
     else:
         if current_version not in driver_blacklist:
@@ -63,10 +88,16 @@ def parse_gpu_driver_results(results="undefined", driver_blacklist="undefined",
                 result["gpu"]["driver_version"] = "WARN - unsupported driver"
     return result
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_gpu_driver_check and parse the results
 def main(argv=None):
     result = run_gpu_driver_check()
-    print(json.dumps(result, indent=2))
+    print(dumps_pretty(result))
 
 
 # Run the main function
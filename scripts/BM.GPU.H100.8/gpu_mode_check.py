@@ -4,26 +4,51 @@ Multi-Instance GPU (MIG) mode allows GPUs to be securely partitioned into up to
 for CUDA applications, providing multiple users with separate GPU resources for optimal GPU utilization.
 """
 
-import shlex
 import subprocess
 import json
 
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# NVML support is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvml import get_gpu_mig_modes
+except ImportError:
+    def get_gpu_mig_modes():
+        return None
+
+# The batched nvidia-smi query is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvidia_smi_batch import query_columns
+except ImportError:
+    def query_columns(*fields):
+        return None
+
 
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
     return output
 
 # Function to check if GPU is in MIG mode (Only for nvidia GPUs)
 def run_gpu_mode_check():
-    cmd = f'nvidia-smi --query-gpu=index,mig.mode.current --format=csv,noheader'
-    output = run_cmd(cmd)
+    # Prefer NVML, then the batched GPU query, then a dedicated nvidia-smi call
+    modes = get_gpu_mig_modes()
+    output = None if modes is None else [f"{index}, {mode}" for index, mode in enumerate(modes)]
+    if output is None:
+        output = query_columns("index", "mig.mode.current")
+    if output is None:
+        cmd = ['nvidia-smi', '--query-gpu=index,mig.mode.current', '--format=csv,noheader']
+        output = run_cmd(cmd)
     result = parse_gpu_mode_results(output)
     return result
 
@@ -56,10 +81,16 @@ def parse_gpu_mode_results(results="undefined"):
     return result
 
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_gpu_mode_check and parse the results
 def main(argv=None):
     result = run_gpu_mode_check()
-    print(json.dumps(result, indent=2))
+    print(dumps_pretty(result))
 
 
 # Run the main function
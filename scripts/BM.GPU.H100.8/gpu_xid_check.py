@@ -6,13 +6,19 @@
 """
 
 import subprocess
-import shlex
 import json
 import re
 import sys
 import os
+import functools
 from datetime import datetime
 
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # XID error codes with descriptions and severity levels
 XID_ERROR_CODES = {
     "1": {"description": "Invalid or corrupted push buffer stream", "severity": "Critical"},
@@ -160,80 +166,194 @@ XID_ERROR_CODES = {
     "143": {"description": "GPU Initialization Failure", "severity": "Warn"}
 }
 
-# Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+# XID messages in dmesg, e.g. "NVRM: Xid (PCI:0000:0f:00): 79, pid=..., GPU has fallen off the bus."
+XID_PREFIX = "NVRM: Xid"
+
+# Function to index an XID code table by integer code, as (description, is_critical)
+def build_xid_code_table(codes):
+    return {int(code): (info["description"], info["severity"] == "Critical") for code, info in codes.items()}
+
+# Function to compile the XID message pattern for an indexed code table. Only known codes
+# match, spelled out as alternations so the match itself tells whether a code is critical:
+# the "critical" group holds critical codes and the "other" group the remaining known codes.
+# The PCI address is captured up to ": <code>," like a per-code search would capture it
+def build_xid_line_pattern(code_table):
+    critical_codes = "|".join(str(code) for code in sorted(code_table) if code_table[code][1])
+    other_codes = "|".join(str(code) for code in sorted(code_table) if not code_table[code][1])
+    return re.compile(re.escape(XID_PREFIX) + r" \(PCI:(?P<pci>.*?): "
+                      r"(?:(?P<critical>" + (critical_codes or "(?!)") + r")|"
+                      r"(?P<other>" + (other_codes or "(?!)") + r")),")
+
+# Function to get XID_ERROR_CODES indexed by integer code, built on first use since a
+# clean dmesg never needs it
+@functools.lru_cache(maxsize=None)
+def xid_code_table():
+    return build_xid_code_table(XID_ERROR_CODES)
+
+# Function to get the XID message pattern for XID_ERROR_CODES, compiled on first use
+@functools.lru_cache(maxsize=None)
+def xid_line_pattern():
+    return build_xid_line_pattern(xid_code_table())
+
+# Result of a clean check, and the same result as main prints it
+XID_PASS_OUTPUT = '{\n  "gpu_xid": {\n    "status": "PASS",\n    "xid_errors": []\n  }\n}'
+
+# Function to build the result of a clean check
+def xid_pass_result():
+    return {"gpu_xid": {"status": "PASS", "xid_errors": []}}
+
+# Function to run command and stream its output line by line; a failing command ends
+# with a single "Error: <command> <exit code>" line
+def run_cmd_iter(argv):
+    # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+    with subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                          encoding='utf8', errors='replace', bufsize=1 << 20) as proc:
+        for line in proc.stdout:
+            yield line.rstrip('\n')
+    if proc.returncode != 0:
+        yield f"Error: {' '.join(argv)} {proc.returncode}"
+
+# Kernel log device, read directly when permitted instead of spawning sudo and dmesg
+KMSG_PATH = "/dev/kmsg"
+
+# Function to open the kernel log for reading, or return None if it cannot be read
+def open_kmsg():
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.splitlines()
-    except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
-    return output
+        return os.open(KMSG_PATH, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return None
+
+# Function to read every record currently in the kernel log and yield its message text.
+# Each read returns one "<priority>,<seq>,<timestamp>,<flags>;<message>" record
+def read_kmsg(fd):
+    while True:
+        try:
+            record = os.read(fd, 8192)
+        except BlockingIOError:
+            # No more records
+            break
+        except BrokenPipeError:
+            # The record was overwritten in the ring buffer while reading; go on with the next
+            continue
+        # Continuation lines (" KEY=value") after the message are not needed
+        yield record.partition(b";")[2].split(b"\n", 1)[0]
 
 # Function to run GPU XID check
 def run_gpu_xid_check():
-    cmd = "sudo dmesg"
-    raw_result = run_cmd(cmd)
-    if not raw_result:
+    cmd = ['sudo', 'dmesg']
+    # Read the kernel log directly if permitted, otherwise stream dmesg, and keep only the
+    # XID messages instead of buffering the whole log
+    kmsg_fd = open_kmsg()
+    line_count = 0
+    xid_lines = []
+    try:
+        if kmsg_fd is not None:
+            lines = (message.decode('utf8', errors='replace') for message in read_kmsg(kmsg_fd))
+        else:
+            lines = run_cmd_iter(cmd)
+        for line in lines:
+            line_count += 1
+            if XID_PREFIX in line:
+                xid_lines.append(line)
+    finally:
+        if kmsg_fd is not None:
+            os.close(kmsg_fd)
+    if not line_count:
         return {"gpu_xid": {"status": "ERROR", "message": "Failed to get dmesg output"}}
-    
-    result = parse_gpu_xid_results("\n".join(raw_result), XID_ERROR_CODES)
+    if not xid_lines:
+        return xid_pass_result()
+
+    result = parse_gpu_xid_results("\n".join(xid_lines), XID_ERROR_CODES)
     return result
 
 # Function to parse GPU XID results
 def parse_gpu_xid_results(results="", codes=None):
-    result = {"gpu_xid": {"status": "PASS", "xid_errors": []}}
-    
     if not results or results == "undefined" or not codes:
         print("!!! Error !!! gpu xid status result is empty or codes not provided")
         result = {"gpu_xid": {"status": "FAIL", "message": "No dmesg data or XID codes available"}}
         return result
     
-    # Look for NVIDIA XID errors in dmesg output
-    if "NVRM: Xid" in results:
-        critical_errors = []
-        warning_errors = []
-        
-        for xid_code in codes.keys():
-            # Pattern to match XID errors: NVRM: Xid (PCI:xxxx:xx:xx.x): <code>,
-            matches = re.findall(f"NVRM: Xid \\(PCI:(.*?): {xid_code},", results)
-            if matches:
-                xid_info = {
-                    "xid_code": xid_code,
-                    "description": codes[xid_code]["description"],
-                    "severity": codes[xid_code]["severity"],
-                    "pci_addresses": matches,
-                    "count": len(matches)
-                }
-                
-                if codes[xid_code]['severity'] == "Critical":
-                    critical_errors.append(xid_info)
-                else:
-                    warning_errors.append(xid_info)
-        
-        # Set result based on findings
-        if critical_errors:
-            result["gpu_xid"]["status"] = "FAIL"
-            result["gpu_xid"]["message"] = f"Critical XID errors detected: {len(critical_errors)} critical, {len(warning_errors)} warnings"
-            result["gpu_xid"]["critical_errors"] = critical_errors
-            result["gpu_xid"]["warning_errors"] = warning_errors
-        elif warning_errors:
-            result["gpu_xid"]["status"] = "WARN"
-            result["gpu_xid"]["message"] = f"Warning XID errors detected: {len(warning_errors)} warnings"
-            result["gpu_xid"]["warning_errors"] = warning_errors
+    # Without any NVIDIA XID message in dmesg output there is nothing else to build
+    if XID_PREFIX not in results:
+        return xid_pass_result()
+
+    result = xid_pass_result()
+    critical_errors = []
+    warning_errors = []
+    
+    # Integer-keyed lookup table and pattern, the module ones unless a different code table is passed
+    if codes is XID_ERROR_CODES:
+        code_table = xid_code_table()
+        pattern = xid_line_pattern()
+    else:
+        code_table = build_xid_code_table(codes)
+        pattern = build_xid_line_pattern(code_table)
+
+    # Collect the PCI addresses of every XID message in one pass, grouped by code and
+    # classified by the pattern. The literal prefix is located with str.find and the
+    # pattern only matched where it occurs
+    matches_by_code = {}
+    critical_codes = set()
+    position = results.find(XID_PREFIX)
+    while position != -1:
+        match = pattern.match(results, position)
+        if match:
+            critical_code = match.group("critical")
+            xid_code = int(critical_code or match.group("other"))
+            if critical_code:
+                critical_codes.add(xid_code)
+            matches_by_code.setdefault(xid_code, []).append(match.group("pci"))
+            position = match.end()
         else:
-            # XID messages found but no matching error codes
-            result["gpu_xid"]["status"] = "WARN"
-            result["gpu_xid"]["message"] = "XID messages found but no recognized error codes"
+            position += len(XID_PREFIX)
+        position = results.find(XID_PREFIX, position)
+
+    for xid_code in sorted(matches_by_code):
+        matches = matches_by_code[xid_code]
+        is_critical = xid_code in critical_codes
+        description = code_table[xid_code][0]
+        xid_info = {
+            "xid_code": str(xid_code),
+            "description": description,
+            "severity": "Critical" if is_critical else "Warn",
+            "pci_addresses": matches,
+            "count": len(matches)
+        }
+
+        if is_critical:
+            critical_errors.append(xid_info)
+        else:
+            warning_errors.append(xid_info)
+    
+    # Set result based on findings
+    if critical_errors:
+        result["gpu_xid"]["status"] = "FAIL"
+        result["gpu_xid"]["message"] = f"Critical XID errors detected: {len(critical_errors)} critical, {len(warning_errors)} warnings"
+        result["gpu_xid"]["critical_errors"] = critical_errors
+        result["gpu_xid"]["warning_errors"] = warning_errors
+    elif warning_errors:
+        result["gpu_xid"]["status"] = "WARN"
+        result["gpu_xid"]["message"] = f"Warning XID errors detected: {len(warning_errors)} warnings"
+        result["gpu_xid"]["warning_errors"] = warning_errors
+    else:
+        # XID messages found but no matching error codes
+        result["gpu_xid"]["status"] = "WARN"
+        result["gpu_xid"]["message"] = "XID messages found but no recognized error codes"
     
     return result
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_gpu_xid_check and format the results
 def main(argv=None):
     print("GPU XID error check is in progress ...")
     result = run_gpu_xid_check()
-    print(json.dumps(result, indent=2))
+    # A clean check, the common case, prints the precomputed output
+    print(XID_PASS_OUTPUT if result == xid_pass_result() else dumps_pretty(result))
     
     # Exit with appropriate code
     if result["gpu_xid"]["status"] == "FAIL":
@@ -2,56 +2,92 @@
 # This script checks the state of each RDMA NIC link and validates link parameters.
 """
 
+import os
 import subprocess
-import shlex
 import json
+import re
 import shutil
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
-# Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+# orjson is optional and only used to speed up parsing the mlxlink JSON and JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Integer and float literals as mlxlink prints them, e.g. "0", "-3", "1.5E-12"
+INT_RE = re.compile(r'[-+]?\d+')
+FLOAT_RE = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+# Function to run command and capture output, as str lines or, for JSON consumers, the
+# undecoded bytes payload as a single chunk
+def run_cmd(argv, text=True):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.splitlines()
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8' if text else None)
+        output = results.stdout.splitlines() if text else [results.stdout]
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        if text:
+            return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} ".encode() + e_process_error.output]
     return output
 
+# Function to decode mlxlink JSON, the bytes are handed to the parser without decoding
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Commands that need root are prefixed with sudo, unless the check already runs as root
+SUDO = () if os.geteuid() == 0 else ('sudo',)
+
+# Function to look up a binary in PATH once per process
+@functools.lru_cache(maxsize=None)
+def which(name):
+    return shutil.which(name)
+
+# Function to join output lines into one buffer, as bytes whether they were decoded or not.
+# A single bytes chunk is returned as is, without a copy
+def join_lines(lines):
+    return b''.join(line.encode() if isinstance(line, str) else line for line in lines)
+
+# Expected link states, shared by every call
+EXPECTED_STATE = "Active"
+EXPECTED_PHYS_STATES = ("LinkUp", "ETH_AN_FSM_ENABLE")
+
+# Helper functions, defined once instead of on every parse. to_float/to_int return the
+# parsed number, or None when the value is not one, so each field is checked and converted once
+def to_float(val):
+    if isinstance(val, str):
+        return float(val) if FLOAT_RE.fullmatch(val.strip()) else None
+    return float(val) if isinstance(val, (int, float)) else None
+
+def to_int(val):
+    if isinstance(val, str):
+        return int(val) if INT_RE.fullmatch(val.strip()) else None
+    return val if isinstance(val, int) else None
+
+def parse_raw_physical_errors_per_lane(val):
+    if isinstance(val, list):
+        return val
+    try:
+        return [int(x) for x in val if x != "undefined"]
+    except Exception:
+        return []
+
 # Function to parse mlxlink output and emit JSON
 def parse_link_results(interface, raw_result, expected_speed,
                       raw_physical_errors_per_lane_threshold=-1,
                       effective_physical_errors_threshold=-1):
     # Join lines and parse JSON
-    results = ''.join(raw_result)
+    results = join_lines(raw_result)
     result = {"link": {"device": interface}}
 
-    # Helper functions
-    def isfloat(val):
-        try:
-            float(val)
-            return True
-        except Exception:
-            return False
-
-    def isint(val):
-        try:
-            int(val)
-            return True
-        except Exception:
-            return False
-
-    def parse_raw_physical_errors_per_lane(val):
-        if isinstance(val, list):
-            return val
-        try:
-            return [int(x) for x in val if x != "undefined"]
-        except Exception:
-            return []
-
     # If error, try to extract JSON
-    if results.startswith("Error:"):
-        index = results.find("{")
+    if results.startswith(b"Error:"):
+        index = results.find(b"{")
         if index != -1:
             results = results[index:]
         else:
@@ -62,32 +98,32 @@ def parse_link_results(interface, raw_result, expected_speed,
         result["link"]["status"] = "FAIL - Invalid interface: {}".format(interface)
         return result
 
+    # Only the three sections below are read, each is looked up once
     try:
-        output = json.loads(results)["result"]["output"]
+        output = json_loads(results)["result"]["output"]
+        operational_info = output["Operational Info"]
+        troubleshooting_info = output["Troubleshooting Info"]
+        counters_info = output["Physical Counters and BER Info"]
     except Exception:
         result["link"]["status"] = "FAIL - Unable to parse mlxlink output"
         return result
 
-    # Expected values
-    expected_state = "Active"
-    expected_phys_state = ["LinkUp", "ETH_AN_FSM_ENABLE"]
-
     # Extract fields
-    speed = output["Operational Info"].get("Speed", "")
-    state = output["Operational Info"].get("State", "")
-    phys_state = output["Operational Info"].get("Physical state", "")
-    status_opcode = output["Troubleshooting Info"].get("Status Opcode", "")
-    recommendation = output["Troubleshooting Info"].get("Recommendation", "")
-    effective_physical_errors = output["Physical Counters and BER Info"].get("Effective Physical Errors", "")
-    effective_physical_ber = output["Physical Counters and BER Info"].get("Effective Physical BER", "")
+    speed = operational_info.get("Speed", "")
+    state = operational_info.get("State", "")
+    phys_state = operational_info.get("Physical state", "")
+    status_opcode = troubleshooting_info.get("Status Opcode", "")
+    recommendation = troubleshooting_info.get("Recommendation", "")
+    effective_physical_errors = counters_info.get("Effective Physical Errors", "")
+    effective_physical_ber = counters_info.get("Effective Physical BER", "")
     raw_physical_errors_per_lane = parse_raw_physical_errors_per_lane(
-        output["Physical Counters and BER Info"].get("Raw Physical Errors Per Lane", []))
-    raw_physical_ber = output["Physical Counters and BER Info"].get("Raw Physical BER", "")
+        counters_info.get("Raw Physical Errors Per Lane", []))
+    raw_physical_ber = counters_info.get("Raw Physical BER", "")
 
     # Set initial FAILs
     result["link"]["link_speed"] = f"FAIL - {speed}, expected {expected_speed}"
-    result["link"]["link_state"] = f"FAIL - {state}, expected {expected_state}"
-    result["link"]["physical_state"] = f"FAIL - {phys_state}, expected {expected_phys_state}"
+    result["link"]["link_state"] = f"FAIL - {state}, expected {EXPECTED_STATE}"
+    result["link"]["physical_state"] = f"FAIL - {phys_state}, expected {list(EXPECTED_PHYS_STATES)}"
     result["link"]["link_status"] = f"FAIL - {recommendation}"
     result["link"]["effective_physical_errors"] = "PASS"
     result["link"]["effective_physical_ber"] = f"FAIL - {effective_physical_ber}"
@@ -97,17 +133,20 @@ def parse_link_results(interface, raw_result, expected_speed,
     # Set PASS if matches
     if expected_speed in speed:
         result["link"]["link_speed"] = "PASS"
-    if state == expected_state:
+    if state == EXPECTED_STATE:
         result["link"]["link_state"] = "PASS"
-    if phys_state in expected_phys_state:
+    if phys_state in EXPECTED_PHYS_STATES:
         result["link"]["physical_state"] = "PASS"
     if status_opcode == "0":
         result["link"]["link_status"] = "PASS"
-    if isfloat(effective_physical_ber) and float(effective_physical_ber) < 1E-12:
+    effective_physical_ber_value = to_float(effective_physical_ber)
+    if effective_physical_ber_value is not None and effective_physical_ber_value < 1E-12:
         result["link"]["effective_physical_ber"] = "PASS"
-    if isfloat(raw_physical_ber) and float(raw_physical_ber) < 1E-5:
+    raw_physical_ber_value = to_float(raw_physical_ber)
+    if raw_physical_ber_value is not None and raw_physical_ber_value < 1E-5:
         result["link"]["raw_physical_ber"] = "PASS"
-    if isint(effective_physical_errors) and int(effective_physical_errors) > effective_physical_errors_threshold:
+    effective_physical_errors_value = to_int(effective_physical_errors)
+    if effective_physical_errors_value is not None and effective_physical_errors_value > effective_physical_errors_threshold:
         result["link"]["effective_physical_errors"] = f"FAIL - {effective_physical_errors}"
     try:
         for lane_error in raw_physical_errors_per_lane:
@@ -144,13 +183,13 @@ def run_link_check():
     expected_raw_physical_errors_per_lane = config["link_check"]["raw_physical_errors_per_lane"]
 
     # Find binaries in the OS
-    ibdev2netdev_bin = shutil.which("ibdev2netdev")
-    mlxlink_bin = shutil.which("mlxlink")
+    ibdev2netdev_bin = which("ibdev2netdev")
+    mlxlink_bin = which("mlxlink")
     if not ibdev2netdev_bin or not mlxlink_bin:
         raise FileNotFoundError("Required binaries 'ibdev2netdev' or 'mlxlink' not found in PATH.")
 
     # Get device list and map mlx devices to OS interface names
-    cmd = f'sudo {ibdev2netdev_bin}'
+    cmd = [*SUDO, ibdev2netdev_bin]
     raw_result = run_cmd(cmd)
     device_to_interface_map = {}
     for line in raw_result:
@@ -159,14 +198,15 @@ def run_link_check():
             interface = line.split()[4]
             device_to_interface_map[device] = interface
 
-    # Find OS interface names for expected mlx devices and create failure results for missing ones
+    # Find OS interface names for expected mlx devices and create failure results for missing ones,
+    # the device name is kept with each interface for the mlxlink call
     interfaces_to_check = []
     interface_results = []
     
     for expected_device in expected_mlx_devices:
         if expected_device in device_to_interface_map:
             os_interface = device_to_interface_map[expected_device]
-            interfaces_to_check.append(os_interface)
+            interfaces_to_check.append((expected_device, os_interface))
         else:
             # Create a failure result for the missing device
             failure_result = {
@@ -185,20 +225,13 @@ def run_link_check():
     if not interfaces_to_check and not interface_results:
         raise RuntimeError("No expected RDMA devices found on the system")
 
-    for interface in interfaces_to_check:
-        # Find the device name for this interface
-        device_name = None
-        for device, iface in device_to_interface_map.items():
-            if iface == interface:
-                device_name = device
-                break
-        
-        if device_name:
-            cmd = f'sudo {mlxlink_bin} -d {device_name} --json --show_module --show_counters --show_eye'
-            raw_result = run_cmd(cmd)
-        else:
-            raw_result = []
+    # Run mlxlink for the interfaces concurrently (bounded), results keep interface order.
+    # Only the operational, troubleshooting and counter sections are read
+    cmds = [[*SUDO, mlxlink_bin, '-d', device, '--json', '--show_counters'] for device, _ in interfaces_to_check]
+    with ThreadPoolExecutor(max_workers=max(min(len(cmds), 8), 1)) as executor:
+        raw_results = list(executor.map(functools.partial(run_cmd, text=False), cmds))
 
+    for (_, interface), raw_result in zip(interfaces_to_check, raw_results):
         result = parse_link_results(
             interface,
             raw_result,
@@ -210,11 +243,17 @@ def run_link_check():
 
     return {"link": interface_results}
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_link_check and print results
 def main(argv=None):
     print("Health check is in progress ...")
     result = run_link_check()
-    print(json.dumps(result, indent=2))
+    print(dumps_pretty(result))
 
 # Run the main function
 if __name__ == "__main__":
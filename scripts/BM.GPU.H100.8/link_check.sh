@@ -64,7 +64,8 @@ for interface in "${INTERFACES_TO_CHECK[@]}"; do
   done
   
   if [[ -n "$device" ]]; then
-    output=$(sudo "$MLXLINK_BIN" -d "$device" --json --show_module --show_counters --show_eye 2>&1)
+    # Only the operational, troubleshooting and counter sections are read
+    output=$(sudo "$MLXLINK_BIN" -d "$device" --json --show_counters 2>&1)
     # Try to extract JSON from output
     json_part=$(echo "$output" | awk '/{/{flag=1}flag')
     if [[ -z "$json_part" ]]; then
@@ -6,19 +6,28 @@ MAX_ACC_OUT_READ must be set to either 0, 44, or 128.
 ADVANCED_PCI_SETTINGS must be set to True.
 """
 
-import shlex
 import subprocess
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Accepted MAX_ACC_OUT_READ values
+MAX_ACC_OUT_READ_VALUES = frozenset(("0", "44", "128"))
 
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
     return output
 
 # Function to parse mlxconfig output and emit JSON
@@ -41,10 +50,15 @@ def run_max_acc_check():
     }
     pci_ids = config["pci_ids"]
 
+    # Query the NICs concurrently (bounded), results keep PCI ID order. mlxconfig takes
+    # one device per call, but is asked for the two checked settings only
+    cmds = [['sudo', mlxconfig_bin, '-d', pci, 'query', 'MAX_ACC_OUT_READ', 'ADVANCED_PCI_SETTINGS']
+            for pci in pci_ids]
+    with ThreadPoolExecutor(max_workers=max(min(len(cmds), 8), 1)) as executor:
+        outputs = list(executor.map(run_cmd, cmds))
+
     pci_config_results = []
-    for pci in pci_ids:
-        cmd = f'sudo {mlxconfig_bin} -d {pci} query'
-        output = run_cmd(cmd)
+    for pci, output in zip(pci_ids, outputs):
         result = parse_acc_results(pci, output)
         pci_config_results.append(result["pcie_config"])
     result = dict(pcie_config=pci_config_results)
@@ -59,23 +73,35 @@ def parse_acc_results(pci_id="undefined", results="undefined"):
              "advanced_pci_settings": "FAIL"}
     }
 
+    # Single pass over the "<name>  <value>" rows of the query. The name is the first column
+    # (after the "*" mlxconfig puts in front of modified settings) and the value the last one,
+    # without the "(<raw value>)" suffix of named values such as "True(1)"
     for line in results:
-        if "MAX_ACC_OUT_READ" in line and "0" in line:
-            result["pcie_config"]["max_acc_out"] = "PASS"
-        elif "MAX_ACC_OUT_READ" in line and "44" in line:
-            result["pcie_config"]["max_acc_out"] = "PASS"
-        elif "MAX_ACC_OUT_READ" in line and "128" in line:
-            result["pcie_config"]["max_acc_out"] = "PASS"
-
-        if "ADVANCED_PCI_SETTINGS" in line and "True" in line:
+        parts = line.split()
+        if parts and parts[0] == "*":
+            parts = parts[1:]
+        if len(parts) < 2:
+            continue
+        name = parts[0]
+        value = parts[-1].partition("(")[0]
+        if name == "MAX_ACC_OUT_READ":
+            if value in MAX_ACC_OUT_READ_VALUES:
+                result["pcie_config"]["max_acc_out"] = "PASS"
+        elif name == "ADVANCED_PCI_SETTINGS" and value == "True":
             result["pcie_config"]["advanced_pci_settings"] = "PASS"
     return result
 
+# Function to serialize results as indented JSON
+def dumps_pretty(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 # Main function to call run_max_acc_check and parse the results
 def main(argv=None):
     print("Health check is in progress and the result will be provided within 1 minute.")
     result = run_max_acc_check()
-    print(json.dumps(result, indent=2))
+    print(dumps_pretty(result))
 
 # Run the main function
 if __name__ == "__main__":
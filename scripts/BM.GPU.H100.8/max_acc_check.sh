@@ -61,7 +61,7 @@ run_max_acc_check() {
     json_array="[]"
 
     for pci in "${pci_ids[@]}"; do
-        cmd="sudo $mlxconfig_bin -d $pci query"
+        cmd="sudo $mlxconfig_bin -d $pci query MAX_ACC_OUT_READ ADVANCED_PCI_SETTINGS"
         output=$(run_cmd "$cmd")
         result=$(parse_acc_results "$pci" "$output")
 
@@ -1,52 +1,73 @@
 """
 # This script checks for missing PCIe interfaces on a specified host by running the `lspci` command
-# and parsing the output for any devices with revision 'ff' (indicating missing/failed devices).
+# and counting the devices with revision 'ff' (indicating missing/failed devices).
 # It returns a JSON object indicating the status of the missing interface check, which can be
 # either "PASS" or "FAIL". The script is designed to be run in a HPC environment where the user
 # has the necessary permissions to run `lspci`.
 """
 
-import shlex
 import subprocess
 import json
 
-# Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
-    try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.strip()
-    except subprocess.CalledProcessError as e_process_error:
-        return f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"
-    return output
+# The lspci listing is shared with the other checks of the process when the helper is present
+try:
+    from _lspci import lspci_lines
+except ImportError:
+    def lspci_lines():
+        return None
+
+# Function to run command and stream its output line by line; a failing command ends
+# with a single "Error: <command> <exit code>" line
+def run_cmd_iter(argv):
+    # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+    with subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                          encoding='utf8', errors='replace') as proc:
+        for line in proc.stdout:
+            yield line.rstrip('\n')
+    if proc.returncode != 0:
+        yield f"Error: {' '.join(argv)} {proc.returncode}"
 
 # Function to parse lspci output and check for missing interfaces
-def parse_missing_interface_results(lspci_result="0"):
+def parse_missing_interface_results(lspci_result=None):
     result = {
          "missing_interface":
             {"status": "PASS", "missing_count": 0}
     }
     
-    try:
-        missing_count = int(lspci_result.strip())
-        result["missing_interface"]["missing_count"] = missing_count
-        
-        if missing_count > 0:
-            result["missing_interface"]["status"] = "FAIL"
-            
-    except (ValueError, AttributeError):
-        # If we can't parse the count or get an error, treat as failure
+    # Devices that stopped responding read back all ones, shown by lspci as revision ff
+    # ("(rev ff)", or a "Rev:\tff" field in the machine-readable listing). The lines are
+    # counted as they arrive; lspci lines start with a slot or field name, never "Error:"
+    line_count = 0
+    missing_count = 0
+    for line in lspci_result or ():
+        if line.startswith("Error:"):
+            line_count = 0
+            break
+        line_count += 1
+        if "(rev ff)" in line or line == "Rev:\tff":
+            missing_count += 1
+
+    if line_count == 0:
+        # If we can't get the device list, treat as failure
         result["missing_interface"]["status"] = "FAIL"
         result["missing_interface"]["error"] = "Unable to parse missing interface count"
+        return result
+
+    result["missing_interface"]["missing_count"] = missing_count
+    if missing_count > 0:
+        result["missing_interface"]["status"] = "FAIL"
         
     return result
 
 # Function to run the missing interface check
 def run_missing_interface_check():
     """ Run missing interface check - checking for PCIe devices with revision 'ff' """
-    cmd = "lspci | grep -i 'rev ff' | wc -l"
-    lspci_result = run_cmd(cmd)
+    # One lspci call, streamed and counted in Python instead of a grep | wc pipeline, unless
+    # the listing shared with the other checks is available
+    lspci_result = lspci_lines()
+    if lspci_result is None:
+        cmd = ['lspci']
+        lspci_result = run_cmd_iter(cmd)
     return parse_missing_interface_results(lspci_result)
 
 # Main function to call run_missing_interface_check and parse the results
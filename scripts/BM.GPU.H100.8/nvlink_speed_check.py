@@ -3,21 +3,25 @@ Script to check NVLink speed and presence on NVIDIA GPUs.
 This script runs the command `nvidia-smi nvlink -s` to gather NVLink
 speed and presence information, and parses the output to determine if the NVLink
 is functioning correctly based on expected speed and count."""
-import shlex
 import subprocess
 import json
 import re
 
+# Patterns for `nvidia-smi nvlink -s` output, compiled once
+GPU_LINE_RE = re.compile(r'GPU\s+(\d+):\s+(?:NVIDIA|HGX)')
+LINK_LINE_RE = re.compile(r'\s+Link\s+(\d+):\s+(.*)\s+GB/s')
+SPEED_NUMBER_RE = re.compile(r'(\d+\.?\d+)')
+
 
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
     return output
 
 
@@ -34,32 +38,42 @@ def parse_nvlink_results(results="undefined", expected_speed=25.0,
         result["gpu"]["nvlink"] = "FAIL - check GPU "
 
     if not isinstance(expected_speed, float):
-        numeric_part = re.search(r'(\d+\.?\d+)', str(expected_speed))
+        numeric_part = SPEED_NUMBER_RE.search(str(expected_speed))
         if numeric_part:
             # If numeric part is found, convert it to float
             expected_speed = float(numeric_part.group())
         else:
             expected_speed = float(expected_speed)
 
+    # For a whole-number threshold only the integer part of each link speed matters, so the
+    # per-link compare is an int compare
+    integral_speed = int(expected_speed) if expected_speed.is_integer() else None
+
     for line in results:
-        gpu_line = re.search('GPU\s+(\d+):\s+(?:NVIDIA|HGX)', line)
-        link_line = re.search('\s+Link\s+(\d+):\s+(.*)\s+GB/s', line)
+        gpu_line = GPU_LINE_RE.search(line)
+        # A GPU line cannot also be a Link line, so only look for one if needed
+        link_line = None if gpu_line else LINK_LINE_RE.search(line)
         if gpu_line:
+            # Store the previous GPU's count once, when its links end
+            if count:
+                nvlink_dict[gpu_num] = count
             gpu_num = gpu_line.group(1)
             count = 0
             link_speed = None
         elif link_line:
             if "inactive" not in line:
                 link_speed = link_line.group(2)
-                if float(link_speed) >= expected_speed:
+                if integral_speed is not None:
+                    if int(link_speed.partition('.')[0]) >= integral_speed:
+                        count += 1
+                elif float(link_speed) >= expected_speed:
                     count += 1
         else:
             # This works b/c the output of `nvidia-smi nvlink -s` should only be a GPU line or a Link line.
             # Anything else means there's a problem.
             result["gpu"]["nvlink"] = f"FAIL - unexpected entry in nvidia-smi nvlink -s output, output: {line}"
-
-        if count:
-            nvlink_dict[gpu_num] = count
+    if count:
+        nvlink_dict[gpu_num] = count
 
     fail_list = []
     for gpu in nvlink_dict:
@@ -67,16 +81,16 @@ def parse_nvlink_results(results="undefined", expected_speed=25.0,
         if current_count != expected_count or len(results) == 0:
             fail_list.append(gpu)
     if fail_list:
-        result["gpu"]["nvlink"] = "FAIL - check GPU " + ",".join(iter(fail_list))
+        result["gpu"]["nvlink"] = "FAIL - check GPU " + ",".join(fail_list)
     return result
 
 
 def run_nvlink_speed_check():
     """ Check NVLink presence and speed """
-    expected_speed = 26
+    expected_speed = 26.0
     expected_count = 18
 
-    cmd = "nvidia-smi nvlink -s"
+    cmd = ['nvidia-smi', 'nvlink', '-s']
     raw_result = run_cmd(cmd)
     result = parse_nvlink_results(raw_result, expected_speed, expected_count)
     return result
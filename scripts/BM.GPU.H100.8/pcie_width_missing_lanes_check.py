@@ -15,85 +15,114 @@ Author: Oracle Cloud Infrastructure
 
 import json
 import os
-import subprocess
 import sys
+from collections import Counter
 from datetime import datetime
 from typing import Dict, List, Tuple
 
+# PCI devices in sysfs, and the vendor IDs of the checked devices as sysfs shows them
+PCI_DEVICES_PATH = "/sys/bus/pci/devices"
+NVIDIA_VENDOR_ID = "0x10de"
+MELLANOX_VENDOR_ID = "0x15b3"
 
-def run_command(cmd: str) -> Tuple[int, str, str]:
+
+def read_sysfs_attribute(device_path: str, name: str) -> str:
     """
-    Execute a shell command and return exit code, stdout, stderr.
+    Read a PCI device attribute from sysfs.
     
     Args:
-        cmd: Command to execute
+        device_path: sysfs directory of the device
+        name: Attribute file name, e.g. "current_link_width"
         
     Returns:
-        Tuple of (exit_code, stdout, stderr)
+        Attribute value, or "" if it cannot be read
     """
     try:
-        result = subprocess.run(
-            cmd, 
-            shell=True, 
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE, 
-            universal_newlines=True, 
-            timeout=30
-        )
-        return result.returncode, result.stdout.strip(), result.stderr.strip()
-    except subprocess.TimeoutExpired:
-        return 124, "", "Command timed out"
-    except Exception as e:
-        return 1, "", str(e)
+        with open(os.path.join(device_path, name)) as attribute_file:
+            return attribute_file.read().strip()
+    except OSError:
+        return ""
+
+
+def format_link_speed(speed: str) -> str:
+    """
+    Format a sysfs link speed the way lspci prints it, e.g. "32.0 GT/s PCIe" -> "32GT/s".
+    
+    Args:
+        speed: Value of current_link_speed or max_link_speed
+        
+    Returns:
+        Formatted speed, or "unknown" if the speed cannot be parsed
+    """
+    try:
+        return f"{float(speed.split()[0]):g}GT/s"
+    except (ValueError, IndexError):
+        return "unknown"
+
+
+def collect_link_status(vendor_id: str) -> Dict[Tuple[str, str, str, str], int]:
+    """
+    Count the PCIe link status of every device of a vendor from sysfs, grouped the same way
+    `lspci -vvv | ... | grep LnkSta | sort | uniq -c` groups identical LnkSta lines. A link is
+    "ok" when it runs at the maximum speed/width of the device, as lspci reports it.
+    
+    Args:
+        vendor_id: PCI vendor ID as sysfs shows it, e.g. "0x10de"
+        
+    Returns:
+        Dict of (speed, speed_state, width, width_state) to device count
+        
+    Raises:
+        OSError: If the PCI devices directory cannot be listed
+    """
+    link_status_counts = Counter()
+    for device in os.listdir(PCI_DEVICES_PATH):
+        device_path = os.path.join(PCI_DEVICES_PATH, device)
+        if read_sysfs_attribute(device_path, "vendor") != vendor_id:
+            continue
+        # Devices without a PCIe link have no link attributes
+        width = read_sysfs_attribute(device_path, "current_link_width")
+        speed = read_sysfs_attribute(device_path, "current_link_speed")
+        if not width or not speed:
+            continue
+        speed = format_link_speed(speed)
+        max_speed = format_link_speed(read_sysfs_attribute(device_path, "max_link_speed"))
+        max_width = read_sysfs_attribute(device_path, "max_link_width")
+        speed_state = "ok" if speed == max_speed and speed != "unknown" else "downgraded"
+        width_state = "ok" if width == max_width else "downgraded"
+        key = (speed, speed_state, width, width_state)
+        link_status_counts[key] += 1
+    return link_status_counts
 
 
-def parse_lspci_width_output(output: str) -> Tuple[Dict[str, int], Dict[str, int], List[str]]:
+def summarize_link_status(link_status_counts: Dict[Tuple[str, str, str, str], int]) -> Tuple[Dict[str, int], Dict[str, int], List[str]]:
     """
-    Parse lspci output to extract PCIe width, speed, and state information.
+    Summarize grouped PCIe link status into width, speed, and state information.
     
     Args:
-        output: Raw output from lspci command
+        link_status_counts: Dict of (speed, speed_state, width, width_state) to device count
         
     Returns:
         Tuple of (width_counts, speed_counts, state_errors)
     """
-    width_counts = {}
-    speed_counts = {}
+    width_counts = Counter()
+    speed_counts = Counter()
     state_errors = []
     
-    lines = output.strip().split('\n')
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Parse line format: "count           LnkSta: Speed 16GT/s (ok), Width x16 (ok)"
-        import re
-        match = re.match(r'^\s*(\d+)\s+LnkSta:\s*Speed\s+([^\s]+)\s*\(([^)]+)\),\s*Width\s+x(\d+)\s*\(([^)]+)\)', line)
-        if match:
-            try:
-                count = int(match.group(1))
-                speed = match.group(2)
-                speed_state = match.group(3)
-                width = match.group(4)
-                width_state = match.group(5)
-                
-                # Count widths only if width state is ok
-                width_key = f"Width x{width}"
-                if width_state == "ok":
-                    width_counts[width_key] = width_counts.get(width_key, 0) + count
-                else:
-                    state_errors.append(f"{count} devices have width state '{width_state}' instead of 'ok'")
-                
-                # Count speeds only if speed state is ok
-                speed_key = f"Speed {speed}"
-                if speed_state == "ok":
-                    speed_counts[speed_key] = speed_counts.get(speed_key, 0) + count
-                else:
-                    state_errors.append(f"{count} devices have speed state '{speed_state}' instead of 'ok'")
-                    
-            except (ValueError, IndexError):
-                continue
+    for (speed, speed_state, width, width_state), count in sorted(link_status_counts.items()):
+        # Count widths only if width state is ok
+        width_key = f"Width x{width}"
+        if width_state == "ok":
+            width_counts[width_key] += count
+        else:
+            state_errors.append(f"{count} devices have width state '{width_state}' instead of 'ok'")
+        
+        # Count speeds only if speed state is ok
+        speed_key = f"Speed {speed}"
+        if speed_state == "ok":
+            speed_counts[speed_key] += count
+        else:
+            state_errors.append(f"{count} devices have speed state '{speed_state}' instead of 'ok'")
                 
     return width_counts, speed_counts, state_errors
 
@@ -105,17 +134,16 @@ def check_gpu_nvswitch_pcie_width() -> Tuple[bool, str, Dict[str, int], Dict[str
     Returns:
         Tuple of (success, error_message, width_counts, speed_counts, state_errors)
     """
-    cmd = "sudo lspci -vvv | egrep '^[0-9,a-f]|LnkSta:' | grep -A 1 -i nvidia | grep LnkSta | sort | uniq -c"
-    
-    exit_code, stdout, stderr = run_command(cmd)
-    
-    if exit_code != 0:
-        return False, f"Failed to execute lspci command: {stderr}", {}, {}, []
+    # Link status is read from sysfs, which needs neither root nor an lspci pipeline
+    try:
+        link_status_counts = collect_link_status(NVIDIA_VENDOR_ID)
+    except OSError as e:
+        return False, f"Failed to read PCI devices: {e}", {}, {}, []
     
-    if not stdout.strip():
+    if not link_status_counts:
         return False, "No NVIDIA PCIe devices found", {}, {}, []
     
-    width_counts, speed_counts, state_errors = parse_lspci_width_output(stdout)
+    width_counts, speed_counts, state_errors = summarize_link_status(link_status_counts)
     
     # Expected for BM.GPU.H100.8: 4x Width x2, 8x Width x16
     expected_width_counts = {
@@ -160,17 +188,16 @@ def check_rdma_pcie_width() -> Tuple[bool, str, Dict[str, int], Dict[str, int],
     Returns:
         Tuple of (success, error_message, width_counts, speed_counts, state_errors)
     """
-    cmd = "sudo lspci -vvv | egrep '^[0-9,a-f]|LnkSta:' | grep -A 1 -i mellanox | grep LnkSta | sort | uniq -c"
-    
-    exit_code, stdout, stderr = run_command(cmd)
-    
-    if exit_code != 0:
-        return False, f"Failed to execute lspci command: {stderr}", {}, {}, []
+    # Link status is read from sysfs, which needs neither root nor an lspci pipeline
+    try:
+        link_status_counts = collect_link_status(MELLANOX_VENDOR_ID)
+    except OSError as e:
+        return False, f"Failed to read PCI devices: {e}", {}, {}, []
     
-    if not stdout.strip():
+    if not link_status_counts:
         return False, "No Mellanox PCIe devices found", {}, {}, []
     
-    width_counts, speed_counts, state_errors = parse_lspci_width_output(stdout)
+    width_counts, speed_counts, state_errors = summarize_link_status(link_status_counts)
     
     # Expected for BM.GPU.H100.8: 2x Width x8, 16x Width x16
     expected_width_counts = {
@@ -208,33 +235,13 @@ def check_rdma_pcie_width() -> Tuple[bool, str, Dict[str, int], Dict[str, int],
     return True, "", width_counts, speed_counts, state_errors
 
 
-def get_oci_shape() -> str:
+def run_pcie_width_missing_lanes_check() -> Dict[str, Dict[str, str]]:
     """
-    Get the current OCI shape from IMDS or environment variable.
+    Run the GPU/NVSwitch and RDMA PCIe width, speed, and state checks.
     
     Returns:
-        OCI shape string
+        Result dict in the format of the other scripts
     """
-    # First try environment variable (useful for testing)
-    shape = os.environ.get("OCI_SHAPE")
-    if shape:
-        return shape
-    
-    # Try IMDS
-    try:
-        cmd = "curl -s -m 10 http://169.254.169.254/opc/v1/instance/shape"
-        exit_code, stdout, stderr = run_command(cmd)
-        if exit_code == 0 and stdout.strip():
-            return stdout.strip()
-    except Exception:
-        pass
-    
-    return "UNKNOWN"
-
-
-def main():
-    """Main function to run PCIe width missing lanes check."""
-    
     overall_success = True
     error_messages = []
     
@@ -263,11 +270,17 @@ def main():
             "status": status
         }
     }
+    return result
+
+
+def main():
+    """Main function to run PCIe width missing lanes check."""
+    result = run_pcie_width_missing_lanes_check()
     
     print(json.dumps(result, indent=2))
     
     # Exit with appropriate code
-    return 0 if overall_success else 1
+    return 0 if result["pcie_width_missing_lanes"]["status"] == "PASS" else 1
 
 
 if __name__ == "__main__":
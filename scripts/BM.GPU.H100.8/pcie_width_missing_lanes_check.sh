@@ -18,6 +18,10 @@ SCRIPT_NAME="pcie_width_missing_lanes_check"
 TIMESTAMP=$(date -u +"%Y-%m-%dT%H:%M:%SZ")
 IS_TERMINAL=false
 
+# The shape of an instance never changes, so IMDS lookups are cached across runs
+SHAPE_CACHE_FILE="/run/oci-dr-hpc/shape.cache"
+SHAPE_CACHE_TTL=86400
+
 # Check if we're running in a terminal
 if [[ -t 1 ]]; then
     IS_TERMINAL=true
@@ -309,9 +313,23 @@ check_rdma_pcie_width() {
     echo "$rdma_success|$final_error|$width_json|$speed_json|$errors_json"
 }
 
+# Function to atomically cache the OCI shape, failures are ignored
+cache_oci_shape() {
+    local shape="$1"
+    local tmp_file
+    
+    mkdir -p "$(dirname "$SHAPE_CACHE_FILE")" 2>/dev/null || return 0
+    tmp_file=$(mktemp "${SHAPE_CACHE_FILE}.XXXXXX" 2>/dev/null) || return 0
+    if printf '%s\n' "$shape" > "$tmp_file" && mv -f "$tmp_file" "$SHAPE_CACHE_FILE"; then
+        return 0
+    fi
+    rm -f "$tmp_file"
+}
+
 # Function to get OCI shape
 get_oci_shape() {
     local shape
+    local cache_mtime
     
     # First try environment variable
     if [[ -n "${OCI_SHAPE:-}" ]]; then
@@ -319,14 +337,41 @@ get_oci_shape() {
         return
     fi
     
-    # Try IMDS
-    if shape=$(curl -s -m 10 http://169.254.169.254/opc/v1/instance/shape 2>/dev/null); then
-        if [[ -n "$shape" ]]; then
-            echo "$shape"
+    # Then try the cached shape if it is recent enough
+    if [[ -s "$SHAPE_CACHE_FILE" ]] && cache_mtime=$(stat -c %Y "$SHAPE_CACHE_FILE" 2>/dev/null); then
+        if (( $(date +%s) - cache_mtime < SHAPE_CACHE_TTL )); then
+            cat "$SHAPE_CACHE_FILE"
             return
         fi
     fi
     
+    # Try IMDS v2, with the v1 request already running in the background so a v2
+    # failure does not add a second round trip
+    local v1_file=""
+    local v1_pid=""
+    if v1_file=$(mktemp 2>/dev/null); then
+        curl -sf -m 10 http://169.254.169.254/opc/v1/instance/shape > "$v1_file" 2>/dev/null &
+        v1_pid=$!
+    fi
+    shape=$(curl -sf -m 10 -H "Authorization: Bearer Oracle" http://169.254.169.254/opc/v2/instance/shape 2>/dev/null) || shape=""
+    if [[ -n "$v1_pid" ]]; then
+        if [[ -n "$shape" ]]; then
+            kill "$v1_pid" 2>/dev/null || true
+        fi
+        wait "$v1_pid" 2>/dev/null || true
+        if [[ -z "$shape" ]]; then
+            shape=$(cat "$v1_file")
+        fi
+        rm -f "$v1_file"
+    elif [[ -z "$shape" ]]; then
+        shape=$(curl -sf -m 10 http://169.254.169.254/opc/v1/instance/shape 2>/dev/null) || shape=""
+    fi
+    if [[ -n "$shape" ]]; then
+        cache_oci_shape "$shape"
+        echo "$shape"
+        return
+    fi
+    
     echo "UNKNOWN"
 }
 
@@ -7,39 +7,35 @@ Missing this module can lead to performance degradation in multi-GPU setups.
 """
 
 import subprocess
-import shlex
 import json
 
-# Execute a system command safely with automatic shell detection.
-def run_cmd(cmd=None):
-    # Split command into arguments for security (prevents injection)
-    cmd_split = shlex.split(cmd)
+# Loaded kernel modules, one per line starting with the module name
+PROC_MODULES_PATH = "/proc/modules"
 
-    try:
-        # Auto-detect if shell features are needed
-        if '|' in cmd_split or '&&' in cmd_split:
-            # Use shell mode for pipes and logical operators
-            results = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        else:
-            # Use safer non-shell mode for simple commands
-            results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, check=True, encoding='utf8')
 
-        # Split output into individual lines for easier processing
+# Function to run command and capture output
+def run_cmd(argv):
+    try:
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        # Return error information if command fails
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
-
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
     return output
 
 
 def run_peermem_module_check():
     """ Check for presence of peermem module """
-    cmd = "/usr/sbin/lsmod"
+    cmd = ["/usr/sbin/lsmod"]
     module_name = "nvidia_peermem"
-    raw_result_list = run_cmd(cmd)
+    # lsmod formats /proc/modules, which lists the module name first on each line as well;
+    # read it directly and only run lsmod if it cannot be read
+    try:
+        with open(PROC_MODULES_PATH) as modules_file:
+            raw_result_list = modules_file.read().splitlines()
+    except OSError:
+        raw_result_list = run_cmd(cmd)
     result = parse_module_results(raw_result_list, module_name)
     return result
 
@@ -49,11 +45,12 @@ def parse_module_results(results, module_name="undefined"):
         "gpu":
             {module_name: "FAIL"}
     }
+    # Match the name column by prefix instead of splitting every line, and stop at the module
+    needle = module_name + " "
     for line in results:
-        if len(line) > 0:
-            name = line.split()[0]
-            if name == module_name:
-                result["gpu"][module_name] = "PASS"
+        if line.startswith(needle):
+            result["gpu"][module_name] = "PASS"
+            break
     return result
 
 
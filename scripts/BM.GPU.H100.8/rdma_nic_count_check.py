@@ -2,27 +2,38 @@
 RDMA NIC Count Check Script
 
 This script verifies that the correct number of RDMA (Remote Direct Memory Access) 
-Network Interface Cards are present on an H100 GPU system. It checks specific PCI 
-bus locations for Mellanox RDMA controllers and validates the count against expected values.
+Network Interface Cards are present on an H100 GPU system. It lists the Mellanox devices
+with a single lspci call, checks the specific PCI bus locations for Mellanox RDMA
+controllers and validates the count against expected values.
 
 RDMA enables high-speed, low-latency network communication between GPUs in distributed 
 computing environments, which is critical for multi-node AI/ML workloads.
 """
 
 import subprocess
-import shlex
 import json
 
+# The lspci listing is shared with the other checks of the process when the helper is present
+try:
+    from _lspci import lspci_columns
+except ImportError:
+    def lspci_columns():
+        return None
 
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
-    try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        output = results.stdout.splitlines()
-    except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
-    return output
+# PCI vendor ID of Mellanox Technologies
+MELLANOX_VENDOR_ID = "15b3"
+
+
+# Function to run command and stream its output line by line; a failing command ends
+# with a single "Error: <command> <exit code>" line
+def run_cmd_iter(argv):
+    # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+    with subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                          encoding='utf8', errors='replace') as proc:
+        for line in proc.stdout:
+            yield line.rstrip('\n')
+    if proc.returncode != 0:
+        yield f"Error: {' '.join(argv)} {proc.returncode}"
 
 
 # Main function to check RDMA NIC count on the system.
@@ -57,34 +68,60 @@ def run_rdma_nic_count_check():
     # Extract the list of PCI IDs from the configuration
     rdma_pci_ids_list = config["rdma_pci_ids"]
 
-    # Initialize list to store results from each PCI device query
-    list_of_results = []
-
-    # Check each expected RDMA device location
-    for device in rdma_pci_ids_list:
-        cmd = f'sudo {lspci_bin} -v -s {device}'
+    # List every Mellanox device in one machine-readable lspci call (-D keeps the PCI domain
+    # in the slot) instead of querying each expected location separately. The shared listing
+    # of all devices works as well, since only Mellanox records are counted
+    lspci_result = lspci_columns()
+    if lspci_result is None:
+        cmd = ['sudo', lspci_bin, '-vmmnnD', '-d', f'{MELLANOX_VENDOR_ID}:']
+        lspci_result = parse_lspci_columns(run_cmd_iter(cmd))
+
+    result = parse_rdma_nic_count_results(columns=lspci_result,
+                                          expected_nics_count=len(rdma_pci_ids_list),
+                                          rdma_pci_ids=rdma_pci_ids_list)
+    return result
 
-        # Execute the command and store the output
-        raw_result = run_cmd(cmd)
-        list_of_results.append(raw_result)
 
-    result = parse_rdma_nic_count_results(results=list_of_results,
-                                          expected_nics_count=len(rdma_pci_ids_list))
-    return result
+# Function to parse `lspci -vmm` output into columns: a list per field name (Slot, Class,
+# Vendor, ...) with one value per device, "" where a device has no such field
+def parse_lspci_columns(lines):
+    columns = {}
+    count = 0
+    in_record = False
+    for line in lines:
+        if not line.strip():
+            if in_record:
+                count += 1
+                in_record = False
+            continue
+        key, sep, value = line.partition(":")
+        if sep:
+            column = columns.setdefault(key, [])
+            column.extend([""] * (count - len(column)))
+            column.append(value.strip())
+            in_record = True
+    if in_record:
+        count += 1
+    for column in columns.values():
+        column.extend([""] * (count - len(column)))
+    return columns
 
 
 # Parse all the results and determine pass/fail status
-def parse_rdma_nic_count_results(results, expected_nics_count):
-    # Initialize counter for detected RDMA NICs
-    num_rdma_nics = 0
-
-    # Search through all lspci output results
-    for line in results:  # For each PCI device queried
-        for sub_line in line:  # For each line of that device's lspci output
-            # Look for the Mellanox manufacturer identifier
-            # Mellanox Technologies makes the RDMA controllers used in H100 systems
-            if "controller: Mellanox Technologies" in sub_line:
-                num_rdma_nics += 1
+def parse_rdma_nic_count_results(columns, expected_nics_count, rdma_pci_ids=None):
+    # Count the Mellanox controllers found at the expected RDMA device locations in one
+    # pass over the slot, vendor and class columns, with the locations in a set so each slot
+    # is a hash lookup and counted once
+    # Mellanox Technologies makes the RDMA controllers used in H100 systems
+    expected_slots = frozenset(rdma_pci_ids) if rdma_pci_ids is not None else None
+    found_slots = set()
+    for slot, vendor, device_class in zip(columns.get("Slot", ()), columns.get("Vendor", ()),
+                                          columns.get("Class", ())):
+        if expected_slots is not None and slot not in expected_slots:
+            continue
+        if vendor.startswith("Mellanox Technologies") and "controller" in device_class:
+            found_slots.add(slot)
+    num_rdma_nics = len(found_slots)
 
     # Compare actual count with expected count and determine result
     if num_rdma_nics == expected_nics_count:
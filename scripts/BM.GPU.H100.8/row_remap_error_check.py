@@ -1,44 +1,76 @@
 """
 Script to check for GPU row remap errors on NVIDIA GPUs.
-This script runs the command `nvidia-smi --query-remapped-rows=gpu_bus_id,remapped_rows.failure --format=csv,noheader`
+This script runs the command `nvidia-smi --query-remapped-rows=gpu_bus_id,remapped_rows.failure --format=csv,noheader,nounits`
 to gather row remap failure information, and parses the output to determine if any GPUs
 have row remap failures. Row remap failures indicate memory errors in the GPU.
 """
-import shlex
+import csv
+import functools
+import shutil
 import subprocess
 import json
 
+# NVML support is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvml import get_gpu_driver_versions, get_gpu_remapped_row_failures
+except ImportError:
+    def get_gpu_driver_versions():
+        return None
+
+    def get_gpu_remapped_row_failures():
+        return None
+
+# The batched nvidia-smi query is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvidia_smi_batch import query_columns
+except ImportError:
+    def query_columns(*fields):
+        return None
+
+# The shared ECC and row remapper query is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvidia_smi_ecc import remapped_row_failures
+except ImportError:
+    def remapped_row_failures():
+        return None
+
+# Expected GPU bus IDs for H100 shape
+EXPECTED_BUS_IDS = frozenset((
+    "00000000:0F:00.0",
+    "00000000:2D:00.0",
+    "00000000:44:00.0",
+    "00000000:5B:00.0",
+    "00000000:89:00.0",
+    "00000000:A8:00.0",
+    "00000000:C0:00.0",
+    "00000000:D8:00.0"
+))
+
 
 # Function to run command and capture output
-def run_cmd(cmd):
-    cmd_split = shlex.split(cmd)
+def run_cmd(argv):
     try:
-        results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, check=True, encoding='utf8')
+        # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+        results = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=False,
+                                 check=True, encoding='utf8')
         output = results.stdout.splitlines()
     except subprocess.CalledProcessError as e_process_error:
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
+        return [f"Error: {' '.join(argv)} {e_process_error.returncode} {e_process_error.output}"]
     return output
 
 
+# Function to look up a binary in PATH, once per process
+@functools.lru_cache(maxsize=None)
+def which(name):
+    return shutil.which(name)
+
+
 def parse_row_remap_results(results="undefined"):
     result = {
         "row_remap_error":
             {"status": "PASS"}
     }
     
-    # Expected GPU bus IDs for H100 shape
-    expected_bus_ids = {
-        "00000000:0F:00.0",
-        "00000000:2D:00.0", 
-        "00000000:44:00.0",
-        "00000000:5B:00.0",
-        "00000000:89:00.0",
-        "00000000:A8:00.0",
-        "00000000:C0:00.0",
-        "00000000:D8:00.0"
-    }
-    
     if len(results) == 0:
         result["row_remap_error"]["status"] = "FAIL"
         result["row_remap_error"]["error"] = "No nvidia-smi output received"
@@ -47,13 +79,10 @@ def parse_row_remap_results(results="undefined"):
     found_bus_ids = set()
     failed_bus_ids = []
     
-    for line in results:
-        line = line.strip()
-        if not line or line.startswith("Error:"):
-            continue
-            
-        # Parse CSV format: gpu_bus_id, remapped_rows.failure
-        parts = line.split(',')
+    # Parse CSV format: gpu_bus_id, remapped_rows.failure
+    rows = csv.reader((line for line in results if line.strip() and not line.lstrip().startswith("Error:")),
+                      skipinitialspace=True)
+    for parts in rows:
         if len(parts) >= 2:
             bus_id = parts[0].strip()
             failure_count = parts[1].strip()
@@ -69,7 +98,7 @@ def parse_row_remap_results(results="undefined"):
                 failed_bus_ids.append(bus_id)
     
     # Check if all expected bus IDs are present
-    missing_bus_ids = expected_bus_ids - found_bus_ids
+    missing_bus_ids = EXPECTED_BUS_IDS - found_bus_ids
     if missing_bus_ids:
         result["row_remap_error"]["status"] = "FAIL"
         result["row_remap_error"]["missing_gpus"] = list(missing_bus_ids)
@@ -82,26 +111,40 @@ def parse_row_remap_results(results="undefined"):
     return result
 
 
+@functools.lru_cache(maxsize=1)
 def get_nvidia_driver_version():
-    """ Get nvidia-smi driver version """
-    cmd = "nvidia-smi --query-gpu=driver_version --format=csv,noheader,nounits"
-    raw_result = run_cmd(cmd)
+    """ Get nvidia-smi driver version, looked up once per process """
+    # Prefer NVML, then the batched GPU query shared with the other GPU checks, then a
+    # dedicated nvidia-smi call
+    raw_result = get_gpu_driver_versions()
+    if raw_result is None:
+        raw_result = query_columns("driver_version")
+    if raw_result is None:
+        cmd = [which('nvidia-smi'), '--query-gpu=driver_version', '--format=csv,noheader,nounits']
+        raw_result = run_cmd(cmd)
     
     if len(raw_result) == 0 or raw_result[0].startswith("Error:"):
         return None
     
     # Get the first line and extract version
     version_line = raw_result[0].strip()
-    # Extract numeric part (e.g., "550.54.15" -> 550)
-    import re
-    version_match = re.search(r'(\d+)', version_line)
-    if version_match:
-        return int(version_match.group(1))
-    return None
+    # Extract the major version (e.g., "550.54.15" -> 550)
+    try:
+        return int(version_line.split('.', 1)[0])
+    except ValueError:
+        return None
 
 
 def run_row_remap_error_check():
     """ Check for GPU row remap errors """
+    # Without nvidia-smi there is no NVIDIA driver to query, skip before spawning anything
+    if which('nvidia-smi') is None:
+        return {
+            "row_remap_error": {
+                "status": "Not applicable: nvidia-smi not found"
+            }
+        }
+
     # Check nvidia-smi driver version first
     driver_version = get_nvidia_driver_version()
     if driver_version is None:
@@ -119,8 +162,14 @@ def run_row_remap_error_check():
             }
         }
     
-    cmd = "nvidia-smi --query-remapped-rows=gpu_bus_id,remapped_rows.failure --format=csv,noheader"
-    raw_result = run_cmd(cmd)
+    # Prefer NVML, then the ECC and row remapper query shared with the SRAM check, then a
+    # dedicated nvidia-smi call
+    raw_result = get_gpu_remapped_row_failures()
+    if raw_result is None:
+        raw_result = remapped_row_failures()
+    if raw_result is None:
+        cmd = [which('nvidia-smi'), '--query-remapped-rows=gpu_bus_id,remapped_rows.failure', '--format=csv,noheader,nounits']
+        raw_result = run_cmd(cmd)
     result = parse_row_remap_results(raw_result)
     return result
 
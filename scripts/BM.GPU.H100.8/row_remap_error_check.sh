@@ -36,7 +36,7 @@ expected_bus_ids=(
 
 # Run nvidia-smi command to get row remap information
 echo "Checking for GPU row remap errors..."
-output=$(nvidia-smi --query-remapped-rows=gpu_bus_id,remapped_rows.failure --format=csv,noheader 2>&1)
+output=$(nvidia-smi --query-remapped-rows=gpu_bus_id,remapped_rows.failure --format=csv,noheader,nounits 2>&1)
 
 # Check if command failed
 if [ $? -ne 0 ]; then
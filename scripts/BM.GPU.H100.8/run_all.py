@@ -0,0 +1,128 @@
+"""
+# This script runs the GPU, PCIe, NIC, NVLink and GPU memory health checks of this directory in one
+# process. The checks mostly wait on the commands they spawn (mlxconfig, lspci, dmesg,
+# nvidia-smi), so they are run concurrently instead of one after another, and checks that read
+# the same command output share one run of it. The results are printed as a single JSON object
+# keyed by check name. Each check script can still be run on its own.
+# With --interval the checks run repeatedly in the same process, which keeps NVML initialized
+# between rounds, and --output writes each round's results to a file for other tools to read.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gpu_clk_check import run_gpu_clk_check
+from gpu_count_check import run_gpu_count_check
+from gpu_driver_check import run_gpu_driver_check
+from gpu_mode_check import run_gpu_mode_check
+from max_acc_check import run_max_acc_check
+from missing_interface_check import run_missing_interface_check
+from nvlink_speed_check import run_nvlink_speed_check
+from pcie_error_check import run_pcie_error_check
+from pcie_width_missing_lanes_check import run_pcie_width_missing_lanes_check
+from peermem_module_check import run_peermem_module_check
+from rdma_nic_count_check import run_rdma_nic_count_check
+from row_remap_error_check import run_row_remap_error_check
+from sram_error_check import run_sram_error_check
+
+# Checks run by this script, by name
+CHECKS = {
+    "gpu_clk": run_gpu_clk_check,
+    "gpu_count": run_gpu_count_check,
+    "gpu_driver": run_gpu_driver_check,
+    "gpu_mode": run_gpu_mode_check,
+    "max_acc": run_max_acc_check,
+    "missing_interface": run_missing_interface_check,
+    "nvlink_speed": run_nvlink_speed_check,
+    "pcie_error": run_pcie_error_check,
+    "pcie_width_missing_lanes": run_pcie_width_missing_lanes_check,
+    "peermem_module": run_peermem_module_check,
+    "rdma_nic_count": run_rdma_nic_count_check,
+    "row_remap_error": run_row_remap_error_check,
+    "sram_error": run_sram_error_check,
+}
+
+# Sibling modules whose memoized command output is refreshed between rounds, and the
+# memoized functions of the checks themselves
+MEMOIZED_MODULES = ("_lspci", "_nvidia_smi_batch", "_nvidia_smi_ecc")
+MEMOIZED_FUNCTIONS = (("row_remap_error_check", "get_nvidia_driver_version"),)
+
+# Function to run one check, a check that raises fails without stopping the others. The
+# failure is keyed by the check name, like the results the checks return themselves
+def run_check(name):
+    try:
+        return CHECKS[name]()
+    except Exception as e_check_error:
+        return {name: {"status": "FAIL", "error": str(e_check_error)}}
+
+# Function to run all checks concurrently (bounded), results keep the order of CHECKS
+def run_all_checks():
+    with ThreadPoolExecutor(max_workers=max(min(len(CHECKS), 8), 1)) as executor:
+        results = list(executor.map(run_check, CHECKS))
+    return dict(zip(CHECKS, results))
+
+# Function to tell whether a check result reports a failure: the checks use different
+# layouts, but every failing status value starts with "FAIL"
+def has_failure(result):
+    if isinstance(result, str):
+        return result.startswith("FAIL")
+    if isinstance(result, dict):
+        return any(has_failure(value) for value in result.values())
+    if isinstance(result, list):
+        return any(has_failure(value) for value in result)
+    return False
+
+# Function to drop the memoized command output of the previous round, for the modules
+# that are loaded
+def clear_caches():
+    for module_name in MEMOIZED_MODULES:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            module.clear_cache()
+    for module_name, function_name in MEMOIZED_FUNCTIONS:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            getattr(module, function_name).cache_clear()
+
+# Function to replace a file with new contents atomically, so readers never see a partial file
+def write_file_atomically(path, contents):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".run_all.")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            tmp_file.write(contents)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+# Main function to call run_all_checks and print the results, once or every interval seconds.
+# A single run returns 1 if any check failed
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the H100 health checks concurrently.")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="run the checks every INTERVAL seconds until interrupted")
+    parser.add_argument("--output", help="write the results to OUTPUT instead of printing them")
+    args = parser.parse_args(argv)
+
+    if not args.output:
+        print("Health checks are in progress and the result will be provided within 1 minute.")
+    while True:
+        result = run_all_checks()
+        if args.output:
+            write_file_atomically(args.output, json.dumps(result, indent=2) + "\n")
+        else:
+            print(json.dumps(result, indent=2), flush=True)
+        if args.interval <= 0:
+            return 1 if has_failure(result) else 0
+        time.sleep(args.interval)
+        clear_caches()
+
+# Run the main function
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,13 +25,22 @@ echo "Health check is in progress ..."
 # Initialize empty array to store results for jq
 results_array=()
 
+# Query all interfaces at once, each into its own file, instead of one after another.
+# Reading statistics needs no privileges, so ethtool runs without sudo
+ethtool_dir=$(mktemp -d)
+trap 'rm -rf "$ethtool_dir"' EXIT
+for interface in "${interfaces[@]}"; do
+    (ethtool -S "$interface" 2>&1 | grep "rx_prio.*_discards" > "$ethtool_dir/$interface" || true) &
+done
+wait
+
 # Check each network interface one by one
 for interface in "${interfaces[@]}"; do
     # Default status is PASS - we'll change it to FAIL if we find problems
     status="PASS"
 
-    # Capture the output of the ethtool command
-    ethtool_output=$(sudo ethtool -S "$interface" 2>&1 | grep "rx_prio.*_discards" || true)
+    # Read the output of the ethtool command
+    ethtool_output=$(cat "$ethtool_dir/$interface")
 
     # Check if the command worked and found discard statistics
     if [[ -z "$ethtool_output" ]]; then
@@ -1,40 +1,51 @@
+import functools
+import os
+import shutil
 import subprocess
-import shlex
 import json
+import xml.etree.ElementTree as ET
+
+# NVML support is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvml import get_gpu_sram_ecc_counts
+except ImportError:
+    def get_gpu_sram_ecc_counts():
+        return None
+
+# The shared ECC and row remapper query is optional and lives in a sibling module; run without it if missing
+try:
+    from _nvidia_smi_ecc import sram_ecc_counts
+except ImportError:
+    def sram_ecc_counts():
+        return None
+
+
+# Commands that need root are prefixed with sudo, unless the check already runs as root
+SUDO = () if os.geteuid() == 0 else ('sudo',)
+
+
+# Function to run a command and parse its output with parse as it arrives, instead of
+# buffering it first. parse reads from a binary file object; returns None if the command fails
+def run_cmd_parse(argv, parse):
+    # Python descriptors are non-inheritable (PEP 446), so skip the child's close_fds sweep
+    with subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                          close_fds=False) as proc:
+        result = parse(proc.stdout)
+    if proc.returncode != 0:
+        return None
+    return result
 
 
-# Execute a system command safely with automatic shell detection.
-def run_cmd(cmd=None):
-    # Split command into arguments for security (prevents injection)
-    cmd_split = shlex.split(cmd)
+# Function to look up a binary in PATH, once per process
+@functools.lru_cache(maxsize=None)
+def which(name):
+    return shutil.which(name)
 
-    try:
-        # Auto-detect if shell features are needed
-        if '|' in cmd_split or '&&' in cmd_split:
-            # Use shell mode for pipes and logical operators
-            results = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, check=True, encoding='utf8')
-        else:
-            # Use safer non-shell mode for simple commands
-            results = subprocess.run(cmd_split, shell=False, stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, check=True, encoding='utf8')
-
-        # Split output into individual lines for easier processing
-        output = results.stdout.splitlines()
-    except subprocess.CalledProcessError as e_process_error:
-        # Return error information if command fails
-        return [f"Error: {cmd} {e_process_error.returncode} {e_process_error.output}"]
-
-    return output
-
-
-# Check if a string can be converted to an integer
-def isint(num):
-    try:
-        int(num)
-        return True
-    except ValueError:
-        return False
+
+# Function to convert a counter value to an int, or None when it is not a count (e.g. "N/A")
+def to_count(value):
+    value = value.strip()
+    return int(value) if value.isascii() and value.isdigit() else None
 
 
 # Check GPU SRAM (Static RAM) memory errors using nvidia-smi
@@ -47,37 +58,75 @@ def run_sram_error_check():
         },
     }
 
-    # Get raw data by run command
-    cmd_uncorrectable = f'sudo nvidia-smi -q | grep -A 3 Aggregate | grep Uncorrectable'
-    cmd_correctable = f'sudo nvidia-smi -q | grep -A 3 Aggregate | grep Correctable'
+    # Without nvidia-smi there is no NVIDIA driver to query, skip before spawning anything
+    if which('nvidia-smi') is None:
+        return {
+            "sram":
+                {"status": "Not applicable: nvidia-smi not found"}
+        }
 
-    sram_uncorrectable_result = run_cmd(cmd_uncorrectable)
-    sram_correctable_result = run_cmd(cmd_correctable)
+    # Prefer NVML, then the ECC and row remapper query shared with the row remap check, then
+    # one nvidia-smi XML query of the ECC section for both error kinds
+    sram_counts = get_gpu_sram_ecc_counts()
+    if sram_counts is None:
+        sram_counts = sram_ecc_counts()
+    if sram_counts is None:
+        cmd = [*SUDO, which('nvidia-smi'), '-q', '-x', '-d', 'ECC']
+        sram_counts = run_cmd_parse(cmd, parse_sram_xml)
+    if sram_counts is None:
+        # nvidia-smi failed, no counts
+        sram_counts = [], []
+    sram_uncorrectable_list, sram_correctable_list = sram_counts
 
     # Get threshold
     sram_uncorrectable_threshold = config["sram_error_check"]["sram_uncorrectable_threshold"]
     sram_correctable_threshold = config["sram_error_check"]["sram_correctable_threshold"]
 
-    sram_uncorrectable_list = []
-    sram_correctable_list = []
-    parity = 0
-
-    # Parity errors are added to SEC-DED errors for total uncorrectable count
-    for line in sram_uncorrectable_result:
-        if ":" in line:
-            if "Parity" in line:
-                parity = int(line.split(':')[1].strip())
-            elif "SEC-DED" in line:
-                sram_uncorrectable_list.append(str(int(line.split(':')[1].strip()) + parity))
-            else:
-                sram_uncorrectable_list.append(line.split(':')[1].strip())
-    for line in sram_correctable_result:
-        sram_correctable_list.append(line.split(':')[1].strip())
-
     return parse_sram_results(sram_uncorrectable_list, sram_correctable_list,
                               sram_uncorrectable_threshold, sram_correctable_threshold)
 
 
+# Extract the aggregate SRAM error counts of each GPU from `nvidia-smi -q -x` output, as
+# (uncorrectable list, correctable list) of ints, None where a GPU reports no count ("N/A").
+# The output is read from xml_file incrementally and each <gpu> is dropped once read
+def parse_sram_xml(xml_file):
+    sram_uncorrectable_list = []
+    sram_correctable_list = []
+    try:
+        for _, gpu in ET.iterparse(xml_file):
+            if gpu.tag == "gpu":
+                read_gpu_sram_counts(gpu, sram_uncorrectable_list, sram_correctable_list)
+                gpu.clear()
+    except ET.ParseError:
+        # Incomplete or unexpected output
+        return [], []
+
+    return sram_uncorrectable_list, sram_correctable_list
+
+
+# Append the aggregate SRAM error counts of one <gpu> element to the lists
+def read_gpu_sram_counts(gpu, sram_uncorrectable_list, sram_correctable_list):
+    aggregate = gpu.find("ecc_errors/aggregate")
+    if aggregate is None:
+        return
+    # Parity errors are added to SEC-DED errors for total uncorrectable count; drivers
+    # that do not split them report a single sram_uncorrectable count
+    secded = aggregate.findtext("sram_uncorrectable_secded")
+    if secded is not None:
+        uncorrectable = to_count(secded)
+        parity = to_count(aggregate.findtext("sram_uncorrectable_parity", "0"))
+        if uncorrectable is not None and parity is not None:
+            uncorrectable += parity
+        sram_uncorrectable_list.append(uncorrectable)
+    else:
+        uncorrectable = aggregate.findtext("sram_uncorrectable")
+        if uncorrectable is not None:
+            sram_uncorrectable_list.append(to_count(uncorrectable))
+    correctable = aggregate.findtext("sram_correctable")
+    if correctable is not None:
+        sram_correctable_list.append(to_count(correctable))
+
+
 # Analyze GPU SRAM error counts against thresholds to determine system health status
 def parse_sram_results(sram_uncorrectable_list=None,
                        sram_correctable_list=None, sram_uncorrectable_threshold=1,
@@ -99,15 +148,12 @@ def parse_sram_results(sram_uncorrectable_list=None,
                 {"status": "FAIL"}
         }
 
-    for value in sram_uncorrectable_list:
-        if isint(value):
-            if int(value) > sram_uncorrectable_threshold:
-                result["sram"]["status"] = "FAIL"
+    # Counts are ints, parsed once; GPUs without a count (None) are skipped
+    if any(value is not None and value > sram_uncorrectable_threshold for value in sram_uncorrectable_list):
+        result["sram"]["status"] = "FAIL"
 
-    for value in sram_correctable_list:
-        if isint(value):
-            if int(value) > sram_correctable_threshold:
-                result["sram"]["status"] = "WARN - SRAM Correctable Exceeded Threshold"
+    if any(value is not None and value > sram_correctable_threshold for value in sram_correctable_list):
+        result["sram"]["status"] = "WARN - SRAM Correctable Exceeded Threshold"
     return result
 
 
@@ -15,74 +15,227 @@ Exit Codes:
     0 - Success (all tests passed)
     1 - Failure (one or more tests failed)
     2 - Error (script execution error)
+
+Helpers for your own tests:
+    runner.run_test(name, f)  - run a test now and record it; returns True if it passed
+    runner.queue_test(name, f), runner.flush()
+                              - run independent, mostly waiting tests concurrently (opt-in)
+    runner.run_command(argv)  - run a command without a shell and return its output
+    path_exists(path)         - os.path.exists, cached; use it for paths the tests do not create
 """
 
+import functools
+import ipaddress
 import json
+import select
+import signal
+import shlex
 import sys
 import time
 import subprocess
 import os
 import shutil
-from datetime import datetime
+import socket
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
-class CustomTestRunner:
+# orjson is optional and only used to speed up JSON output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Output icons, picked once depending on whether output goes to a terminal or is captured
+TERMINAL_ICONS = {
+    "TEST": "🧪", "PASS": "✅", "FAIL": "❌", "SKIP": "⚠️", "ERROR": "💥", "UNKNOWN": "❓",
+    "INFO": "ℹ️", "SYSTEM": "📋", "NET": "🌐", "GPU": "🖥️", "CUSTOM": "🧪",
+    "SUMMARY": "📊", "RESULTS": "📋", "JSON": "📄",
+    "START": "🚀", "SUCCESS": "✅", "FAILED": "❌"
+}
+PLAIN_ICONS = {
+    "TEST": "[TEST]", "PASS": "[PASS]", "FAIL": "[FAIL]", "SKIP": "[SKIP]", "ERROR": "[ERROR]", "UNKNOWN": "[?]",
+    "INFO": "[INFO]", "SYSTEM": "[INFO]", "NET": "[NET]", "GPU": "[GPU]", "CUSTOM": "[CUSTOM]",
+    "SUMMARY": "", "RESULTS": "", "JSON": "",
+    "START": "", "SUCCESS": "[SUCCESS]", "FAILED": "[FAILED]"
+}
+
+@functools.lru_cache(maxsize=256)
+def path_exists(path):
+    """Return whether a path exists, checked once per path since tests often probe the same files."""
+    return os.path.exists(path)
+
+def utc_timestamp():
+    """Return the current UTC time as an ISO 8601 string with a Z suffix."""
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+class BatchShell:
+    """A long-lived bash process that runs commands one after another, so N commands cost one
+    process start instead of N. Each command's output ends at a unique marker line carrying its
+    exit code; stderr goes to a scratch file that is read back after the command.
+    """
+    
     def __init__(self):
+        self.proc = None
+        self.lock = threading.Lock()
+        fd, self.stderr_path = tempfile.mkstemp(prefix="custom_test_stderr.")
+        os.close(fd)
+    
+    def start(self):
+        # Own session, so a timed out command can be killed together with the shell
+        self.proc = subprocess.Popen(["bash"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, bufsize=-1, start_new_session=True)
+    
+    def run(self, cmd, timeout=30):
+        """Run a command (argument list or shell string) and return a subprocess.CompletedProcess."""
+        command = cmd if isinstance(cmd, str) else " ".join(shlex.quote(arg) for arg in cmd)
+        marker = f"__END_{uuid.uuid4().hex}__"
+        with self.lock:
+            if self.proc is None or self.proc.poll() is not None:
+                self.start()
+            # Commands read /dev/null, not the command stream of the shell
+            script = (f"{{ {command}\n}} </dev/null 2>{shlex.quote(self.stderr_path)}; "
+                      f"printf '\\n{marker}:%s\\n' \"$?\"\n")
+            self.proc.stdin.write(script.encode())
+            self.proc.stdin.flush()
+            
+            fd = self.proc.stdout.fileno()
+            end = f"\n{marker}:".encode()
+            deadline = time.monotonic() + timeout
+            output = bytearray()
+            while True:
+                index = output.find(end)
+                if index != -1 and output.endswith(b"\n") and len(output) > index + len(end):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                    self.close()
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    self.close()
+                    raise OSError("batch shell exited while running the command")
+                output += chunk
+            returncode = int(output[index + len(end):].split(b"\n", 1)[0])
+            with open(self.stderr_path, errors="replace") as stderr_file:
+                stderr = stderr_file.read()
+        return subprocess.CompletedProcess(cmd, returncode, output[:index].decode(errors="replace"), stderr)
+    
+    def close(self):
+        """Stop the shell and everything it started; the next run() starts a new one."""
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            self.proc.wait()
+        self.proc = None
+
+class CustomTestRunner:
+    # Result messages of tests that ran to completion, by status
+    STATUS_MESSAGES = {"PASS": "Test passed", "FAIL": "Test failed"}
+    
+    def __init__(self, batch_shell=False):
         self.results = []
-        self.start_time = time.time()
+        self._pending = []
+        # Wall clock read once; test timestamps are derived from the monotonic clock
+        self.start_time = time.perf_counter()
+        self.start_wall = datetime.now(timezone.utc)
         # Detect if output is going to terminal or being captured
         self.is_terminal = sys.stdout.isatty()
+        self.icons = TERMINAL_ICONS if self.is_terminal else PLAIN_ICONS
+        # nvidia-smi is looked up once, and its GPU query result is shared by the GPU tests
+        self.nvidia_smi = shutil.which("nvidia-smi")
+        self._nvsmi_cache = {}
+        self._nvsmi_lock = threading.Lock()
+        # Optionally run commands through one long-lived shell instead of a process per command
+        self.batch_shell = BatchShell() if batch_shell else None
         
+    def timestamp(self):
+        """Return the current UTC time as an ISO 8601 string with a Z suffix, from the monotonic clock."""
+        now = self.start_wall + timedelta(seconds=time.perf_counter() - self.start_time)
+        return now.isoformat().replace("+00:00", "Z")
+    
     def run_test(self, test_name, test_func, expected_result="PASS"):
         """Run a single test and record the result."""
-        test_icon = "🧪" if self.is_terminal else "[TEST]"
-        print(f"{test_icon} Running test: {test_name}")
+        # Queued tests were added first, so they run and are recorded first
+        self.flush()
+        print(f"{self.icons['TEST']} Running test: {test_name}")
+        record = self.execute_test(test_name, test_func)
+        self.print_result(record)
+        self.results.append(record)
+        return record["status"] == "PASS"
+    
+    def queue_test(self, test_name, test_func):
+        """Queue a test to run concurrently with the other queued tests on flush().
         
+        Use it for independent tests that mostly wait, such as command or network probes.
+        """
+        self._pending.append((test_name, test_func))
+    
+    def flush(self, max_workers=8):
+        """Run the queued tests concurrently and record their results in the order they were queued."""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        for test_name, _ in pending:
+            print(f"{self.icons['TEST']} Running test: {test_name}")
+        with ThreadPoolExecutor(max_workers=min(len(pending), max_workers)) as executor:
+            records = list(executor.map(lambda test: self.execute_test(*test), pending))
+        for record in records:
+            self.print_result(record)
+            self.results.append(record)
+    
+    def execute_test(self, test_name, test_func):
+        """Run a single test function and return its result record."""
+        timestamp = self.timestamp()
         try:
-            result = test_func()
-            if result:
-                status = "PASS"
-                pass_icon = "✅" if self.is_terminal else "[PASS]"
-                print(f"{pass_icon} PASS: {test_name}")
-            else:
-                status = "FAIL"
-                fail_icon = "❌" if self.is_terminal else "[FAIL]"
-                print(f"{fail_icon} FAIL: {test_name}")
-                
-            self.results.append({
-                "test_name": test_name,
-                "status": status,
-                "message": f"Test {status.lower()}ed",
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            })
-            
+            status = "PASS" if test_func() else "FAIL"
+            message = self.STATUS_MESSAGES[status]
         except Exception as e:
             status = "ERROR"
-            error_icon = "💥" if self.is_terminal else "[ERROR]"
-            print(f"{error_icon} ERROR: {test_name} - {str(e)}")
-            self.results.append({
-                "test_name": test_name,
-                "status": status,
-                "message": f"Test error: {str(e)}",
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            })
-            
-        return status == "PASS"
+            message = f"Test error: {str(e)}"
+        return {
+            "test_name": test_name,
+            "status": status,
+            "message": message,
+            "timestamp": timestamp
+        }
+    
+    def print_result(self, record):
+        """Print the outcome line of a test result record."""
+        status = record["status"]
+        if status == "ERROR":
+            print(f"{self.icons['ERROR']} ERROR: {record['test_name']} - {record['message'][len('Test error: '):]}")
+        else:
+            print(f"{self.icons[status]} {status}: {record['test_name']}")
     
     def skip_test(self, test_name, reason):
         """Skip a test with a reason."""
-        skip_icon = "⚠️" if self.is_terminal else "[SKIP]"
-        print(f"{skip_icon} SKIP: {test_name} - {reason}")
+        self.flush()
+        print(f"{self.icons['SKIP']} SKIP: {test_name} - {reason}")
         self.results.append({
             "test_name": test_name,
             "status": "SKIP",
             "message": f"Skipped: {reason}",
-            "timestamp": datetime.utcnow().isoformat() + "Z"
+            "timestamp": self.timestamp()
         })
         
     def run_command(self, cmd, timeout=30):
-        """Execute a system command and return the result."""
+        """Execute a system command and return the result.
+
+        cmd is an argument list, run without a shell. A command string is run through /bin/sh
+        as before. With a batch shell, commands run in it one at a time instead.
+        """
+        use_shell = isinstance(cmd, str)
         try:
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=timeout)
+            if self.batch_shell is not None:
+                result = self.batch_shell.run(cmd, timeout)
+            else:
+                result = subprocess.run(cmd, shell=use_shell, capture_output=True, text=True, timeout=timeout)
             return {
                 "success": result.returncode == 0,
                 "stdout": result.stdout.strip(),
@@ -96,6 +249,14 @@ class CustomTestRunner:
                 "stderr": "Command timed out",
                 "returncode": 124
             }
+        except FileNotFoundError:
+            # Same exit code as the shell gives for an unknown command
+            return {
+                "success": False,
+                "stdout": "",
+                "stderr": f"{cmd[0]}: command not found",
+                "returncode": 127
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -104,112 +265,147 @@ class CustomTestRunner:
                 "returncode": 1
             }
     
+    def close(self):
+        """Release resources held by the runner."""
+        if self.batch_shell is not None:
+            self.batch_shell.close()
+            os.unlink(self.batch_shell.stderr_path)
+            self.batch_shell = None
+    
+    def query_nvidia_smi(self, query="index,name"):
+        """Run `nvidia-smi --query-gpu=<query>` once and return its result, one row per GPU."""
+        # Tests run concurrently; the lock makes the first caller run the query for all of them
+        with self._nvsmi_lock:
+            if query not in self._nvsmi_cache:
+                result = self.run_command([self.nvidia_smi, f"--query-gpu={query}", "--format=csv,noheader"])
+                result["rows"] = [line.split(", ") for line in result["stdout"].splitlines() if line]
+                self._nvsmi_cache[query] = result
+            return self._nvsmi_cache[query]
+    
+    def tcp_probe(self, host, port, timeout):
+        """Check that a host is reachable by opening a TCP connection to it, without spawning ping.
+        
+        Only a completed connection counts, except on loopback where a refused connection means
+        the local stack answered; elsewhere a firewall or proxy may send the refusal.
+        """
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except ConnectionRefusedError:
+            try:
+                return ipaddress.ip_address(host).is_loopback
+            except ValueError:
+                return host == "localhost"
+        except OSError:
+            return False
+    
     def check_system_requirements(self):
         """Check basic system requirements."""
-        header_icon = "📋" if self.is_terminal else "[INFO]"
-        print(f"{header_icon} Checking system requirements...")
+        print(f"{self.icons['SYSTEM']} Checking system requirements...")
         
         # Check Python version
         def python_version_test():
             return sys.version_info >= (3, 6)
         
-        self.run_test("python_version_check", python_version_test)
+        self.queue_test("python_version_check", python_version_test)
         
         # Check available disk space
         def disk_space_test():
             try:
-                total, used, free = shutil.disk_usage("/")
-                free_gb = free / (1024**3)
-                return free_gb > 1.0
-            except:
+                # Space available to unprivileged users, as shutil.disk_usage reports it as free
+                stat = os.statvfs("/")
+                return stat.f_bavail * stat.f_frsize > (1 << 30)
+            except OSError:
                 return False
         
-        self.run_test("disk_space_check", disk_space_test)
+        self.queue_test("disk_space_check", disk_space_test)
         
         # Check if /tmp is writable
         def tmp_writable_test():
             try:
+                # Unbuffered write straight through the file descriptor
                 test_file = "/tmp/test_write_permission"
-                with open(test_file, "w") as f:
-                    f.write("test")
-                os.remove(test_file)
+                fd = os.open(test_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                try:
+                    os.write(fd, b"test")
+                finally:
+                    os.close(fd)
+                os.unlink(test_file)
                 return True
-            except:
+            except OSError:
                 return False
         
-        self.run_test("tmp_writable_check", tmp_writable_test)
+        self.queue_test("tmp_writable_check", tmp_writable_test)
+        self.flush()
         
     def check_network_connectivity(self):
         """Check network connectivity."""
-        header_icon = "🌐" if self.is_terminal else "[NET]"
-        print(f"{header_icon} Checking network connectivity...")
+        print(f"{self.icons['NET']} Checking network connectivity...")
         
-        # Check localhost connectivity
+        # Check localhost connectivity, any answer on the SSH port means the stack is up
         def localhost_test():
-            result = self.run_command("ping -c 1 -W 5 127.0.0.1")
-            return result["success"]
+            return self.tcp_probe("127.0.0.1", 22, timeout=0.5)
         
-        self.run_test("localhost_ping_check", localhost_test)
+        self.queue_test("localhost_ping_check", localhost_test)
+        
+        # Check external connectivity (if available) on the DNS port, the probe that decides
+        # whether to run the test is the test result as well, so 8.8.8.8 is probed only once
+        self._external_ok = self.tcp_probe("8.8.8.8", 53, timeout=1.0)
         
-        # Check external connectivity (if available)
         def external_test():
-            result = self.run_command("ping -c 1 -W 5 8.8.8.8")
-            return result["success"]
+            return self._external_ok
         
-        if self.run_command("ping -c 1 -W 1 8.8.8.8")["success"]:
-            self.run_test("external_ping_check", external_test)
+        if self._external_ok:
+            self.queue_test("external_ping_check", external_test)
         else:
             self.skip_test("external_ping_check", "No external network access")
+        self.flush()
     
     def check_gpu_availability(self):
         """Check GPU availability."""
-        header_icon = "🖥️" if self.is_terminal else "[GPU]"
-        print(f"{header_icon} Checking GPU availability...")
+        print(f"{self.icons['GPU']} Checking GPU availability...")
         
         # Check if nvidia-smi is available
-        nvidia_result = self.run_command("which nvidia-smi")
-        if nvidia_result["success"]:
+        if self.nvidia_smi:
+            # Both tests read the same nvidia-smi query, which runs once
             def nvidia_smi_test():
-                result = self.run_command("nvidia-smi")
-                return result["success"]
+                return self.query_nvidia_smi()["success"]
             
-            self.run_test("nvidia_smi_check", nvidia_smi_test)
+            self.queue_test("nvidia_smi_check", nvidia_smi_test)
             
             # Check GPU count
             def gpu_count_test():
-                result = self.run_command("nvidia-smi --query-gpu=count --format=csv,noheader")
+                result = self.query_nvidia_smi()
                 if result["success"]:
-                    try:
-                        count = len(result["stdout"].split('\n'))
-                        info_icon = "ℹ️" if self.is_terminal else "[INFO]"
-                        print(f"{info_icon} Found {count} GPU(s)")
-                        return count > 0
-                    except:
-                        return False
+                    count = len(result["rows"])
+                    print(f"{self.icons['INFO']} Found {count} GPU(s)")
+                    return count > 0
                 return False
             
-            self.run_test("gpu_count_check", gpu_count_test)
+            self.queue_test("gpu_count_check", gpu_count_test)
+            self.flush()
         else:
             self.skip_test("gpu_availability_check", "nvidia-smi not available")
     
     def run_custom_tests(self):
         """Run custom tests."""
-        header_icon = "🧪" if self.is_terminal else "[CUSTOM]"
-        print(f"{header_icon} Running custom tests...")
+        print(f"{self.icons['CUSTOM']} Running custom tests...")
         
         # Example: Check if a specific file exists
         def config_file_test():
-            return os.path.exists("/etc/hostname")
+            return path_exists("/etc/hostname")
         
         self.run_test("config_file_check", config_file_test)
         
-        # Example: Performance test
+        # Example: Performance test, set CUSTOM_TEST_PERF_DEMO to simulate 100ms of work
         def performance_test():
-            start = time.time()
-            time.sleep(0.1)  # Simulate work
-            duration = time.time() - start
-            info_icon = "ℹ️" if self.is_terminal else "[INFO]"
-            print(f"{info_icon} Performance test took {duration:.3f}s")
+            start = time.perf_counter()
+            if os.environ.get("CUSTOM_TEST_PERF_DEMO"):
+                time.sleep(0.1)  # Simulate work
+            else:
+                sum(range(10000))
+            duration = time.perf_counter() - start
+            print(f"{self.icons['INFO']} Performance test took {duration:.3f}s")
             return duration < 1.0
         
         self.run_test("performance_test", performance_test)
@@ -218,27 +414,30 @@ class CustomTestRunner:
         def memory_test():
             try:
                 # Simple memory allocation test
-                test_data = [i for i in range(1000)]
+                test_data = list(range(1000))
                 return len(test_data) == 1000
-            except:
+            except MemoryError:
                 return False
         
         self.run_test("memory_allocation_test", memory_test)
         
     def generate_summary(self):
         """Generate test summary."""
+        self.flush()
         total_tests = len(self.results)
-        passed_tests = len([r for r in self.results if r["status"] == "PASS"])
-        failed_tests = len([r for r in self.results if r["status"] == "FAIL"])
-        skipped_tests = len([r for r in self.results if r["status"] == "SKIP"])
-        error_tests = len([r for r in self.results if r["status"] == "ERROR"])
+        # Count every status in one pass over the results
+        status_counts = Counter(r["status"] for r in self.results)
+        passed_tests = status_counts["PASS"]
+        failed_tests = status_counts["FAIL"]
+        skipped_tests = status_counts["SKIP"]
+        error_tests = status_counts["ERROR"]
         
-        execution_time = time.time() - self.start_time
+        execution_time = time.perf_counter() - self.start_time
         success_rate = (passed_tests / total_tests * 100) if total_tests > 0 else 0
         
         summary = {
             "test_suite": "custom_python_template",
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": self.timestamp(),
             "execution_time_seconds": round(execution_time, 2),
             "summary": {
                 "total_tests": total_tests,
@@ -256,8 +455,7 @@ class CustomTestRunner:
     def print_summary(self, summary):
         """Print test summary."""
         print("\n" + "=" * 50)
-        summary_icon = "📊" if self.is_terminal else ""
-        print(f"{summary_icon} TEST SUMMARY".strip())
+        print(f"{self.icons['SUMMARY']} TEST SUMMARY".strip())
         print("=" * 50)
         print(f"Total Tests: {summary['summary']['total_tests']}")
         print(f"Passed: {summary['summary']['passed']}")
@@ -267,40 +465,30 @@ class CustomTestRunner:
         print(f"Success Rate: {summary['summary']['success_rate']}%")
         print(f"Execution Time: {summary['execution_time_seconds']}s")
         
-        results_icon = "📋" if self.is_terminal else ""
-        print(f"\n{results_icon} DETAILED RESULTS:".strip())
+        print(f"\n{self.icons['RESULTS']} DETAILED RESULTS:".strip())
         print("-" * 50)
         for result in self.results:
-            if self.is_terminal:
-                status_icon = {
-                    "PASS": "✅",
-                    "FAIL": "❌",
-                    "SKIP": "⚠️",
-                    "ERROR": "💥"
-                }.get(result["status"], "❓")
-            else:
-                status_icon = {
-                    "PASS": "[PASS]",
-                    "FAIL": "[FAIL]",
-                    "SKIP": "[SKIP]",
-                    "ERROR": "[ERROR]"
-                }.get(result["status"], "[?]")
-            
+            status_icon = self.icons.get(result["status"], self.icons["UNKNOWN"])
             print(f"{status_icon} {result['test_name']}: {result['message']}")
         
-        json_icon = "📄" if self.is_terminal else ""
-        print(f"\n{json_icon} JSON OUTPUT:".strip())
-        print(json.dumps(summary, indent=2))
+        print(f"\n{self.icons['JSON']} JSON OUTPUT:".strip())
+        # Write the JSON straight to stdout instead of building the whole string first
+        if orjson is not None:
+            sys.stdout.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2).decode())
+        else:
+            json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write("\n")
 
 def main():
     """Main test execution function."""
-    is_terminal = sys.stdout.isatty()
-    start_icon = "🚀" if is_terminal else ""
-    print(f"{start_icon} Starting Custom Python Test Script".strip())
+    icons = TERMINAL_ICONS if sys.stdout.isatty() else PLAIN_ICONS
+    print(f"{icons['START']} Starting Custom Python Test Script".strip())
     print("=" * 50)
     
+    runner = None
     try:
-        runner = CustomTestRunner()
+        # Set CUSTOM_TEST_BATCH_SHELL to run all commands through one shell process
+        runner = CustomTestRunner(batch_shell=bool(os.environ.get("CUSTOM_TEST_BATCH_SHELL")))
         
         # Run different test categories
         runner.check_system_requirements()
@@ -317,25 +505,25 @@ def main():
         
         # Return appropriate exit code
         if success:
-            success_icon = "✅" if is_terminal else "[SUCCESS]"
-            print(f"\n{success_icon} All tests passed!")
+            print(f"\n{icons['SUCCESS']} All tests passed!")
             return 0
         else:
-            fail_icon = "❌" if is_terminal else "[FAILED]"
-            print(f"\n{fail_icon} Some tests failed or had errors")
+            print(f"\n{icons['FAILED']} Some tests failed or had errors")
             return 1
             
     except Exception as e:
-        error_icon = "💥" if is_terminal else "[ERROR]"
-        print(f"\n{error_icon} Script execution error: {e}")
+        print(f"\n{icons['ERROR']} Script execution error: {e}")
         error_report = {
             "test_suite": "custom_python_template",
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": utc_timestamp(),
             "error": str(e),
             "status": "ERROR"
         }
         print(json.dumps(error_report, indent=2))
         return 2
+    finally:
+        if runner is not None:
+            runner.close()
 
 if __name__ == "__main__":
     sys.exit(main()) 
\ No newline at end of file